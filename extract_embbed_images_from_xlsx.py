@@ -1,14 +1,18 @@
-import xml.etree.ElementTree as ET
-import zipfile
+import multiprocessing
 import os
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-from pathlib import Path
 import threading
 import queue
 
-# openpyxl导入将在create_excel_worksheet方法中处理
-OPENPYXL_AVAILABLE = None  # 将在运行时确定
+from xlsx_cellimages import Metrics, run_extraction
+from xlsx_cellimages.thumbnails import THUMBNAIL_DEFAULT_SIZE
+
+# 界面刷新间隔（毫秒），进度条每秒最多更新10次
+UI_UPDATE_INTERVAL_MS = 100
+# 日志区域最多保留的行数，更早的日志从顶部移除
+LOG_VIEW_MAX_LINES = 2000
+LOG_FILE_NAME = 'extract_log.txt'
 
 def win_path(path_str):
     """将路径字符串转换为Windows格式（如果适用）"""
@@ -73,6 +77,26 @@ class XLSXImageExtractorGUI:
                                                     variable=self.extract_images_var)
         self.extract_images_check.grid(row=2, column=0, sticky=tk.W, pady=(5, 0))
         
+        self.referenced_only_var = tk.BooleanVar(value=False)
+        self.referenced_only_check = ttk.Checkbutton(options_frame, text="仅提取被单元格引用的图像（跳过浮动图片、图表图片等）", 
+                                                     variable=self.referenced_only_var)
+        self.referenced_only_check.grid(row=3, column=0, sticky=tk.W, pady=(5, 0))
+        
+        self.locate_cells_var = tk.BooleanVar(value=False)
+        self.locate_cells_check = ttk.Checkbutton(options_frame, text="定位图像所在单元格（生成 extracted_cells.csv）", 
+                                                  variable=self.locate_cells_var)
+        self.locate_cells_check.grid(row=4, column=0, sticky=tk.W, pady=(5, 0))
+        
+        self.thumbnails_var = tk.BooleanVar(value=False)
+        self.thumbnails_check = ttk.Checkbutton(options_frame, text=f"生成缩略图（最长边 {THUMBNAIL_DEFAULT_SIZE} 像素，需要Pillow）", 
+                                                variable=self.thumbnails_var)
+        self.thumbnails_check.grid(row=5, column=0, sticky=tk.W, pady=(5, 0))
+        
+        self.save_log_var = tk.BooleanVar(value=False)
+        self.save_log_check = ttk.Checkbutton(options_frame, text=f"保存完整日志到输出目录 ({LOG_FILE_NAME})", 
+                                              variable=self.save_log_var)
+        self.save_log_check.grid(row=6, column=0, sticky=tk.W, pady=(5, 0))
+        
         # 控制按钮
         button_frame = ttk.Frame(main_frame)
         button_frame.grid(row=5, column=0, columnspan=3, pady=(10, 10))
@@ -107,6 +131,8 @@ class XLSXImageExtractorGUI:
         
         # 消息队列用于线程安全更新UI
         self.message_queue = queue.Queue()
+        # 最新的进度值，由后台线程直接覆盖，定时刷新到进度条
+        self.pending_progress = None
         
         # 定期检查消息队列
         self.check_queue()
@@ -136,9 +162,19 @@ class XLSXImageExtractorGUI:
     
     def log_message(self, message):
         """向日志区域添加消息"""
-        self.log_text.insert(tk.END, message + "\n")
+        self.append_log_lines([message])
+    
+    def append_log_lines(self, lines):
+        """批量向日志区域添加消息，只保留最近 LOG_VIEW_MAX_LINES 行"""
+        if not lines:
+            return
+        lines = lines[-LOG_VIEW_MAX_LINES:]
+        self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+        # 删除超出上限的旧日志（末尾总有一个空行）
+        line_count = int(self.log_text.index("end-1c").split(".")[0]) - 1
+        if line_count > LOG_VIEW_MAX_LINES:
+            self.log_text.delete("1.0", f"{line_count - LOG_VIEW_MAX_LINES + 1}.0")
         self.log_text.see(tk.END)
-        self.root.update_idletasks()
     
     def clear_log(self):
         """清空日志区域"""
@@ -147,35 +183,51 @@ class XLSXImageExtractorGUI:
     def update_status(self, message):
         """更新状态标签"""
         self.status_var.set(message)
-        self.root.update_idletasks()
     
     def update_progress(self, value):
         """更新进度条"""
         self.progress_var.set(value)
-        self.root.update_idletasks()
     
     def check_queue(self):
-        """定期检查消息队列并更新UI"""
+        """定期检查消息队列并批量更新UI"""
+        lines = []
         try:
             while True:
                 msg_type, *args = self.message_queue.get_nowait()
                 if msg_type == "log":
-                    self.log_message(*args)
-                elif msg_type == "status":
+                    lines.append(args[0])
+                    continue
+                # 其他消息前先写出已积累的日志，保持顺序
+                self.append_log_lines(lines)
+                lines = []
+                if msg_type == "status":
                     self.update_status(*args)
-                elif msg_type == "progress":
-                    self.update_progress(*args)
                 elif msg_type == "enable_buttons":
                     self.enable_buttons(*args)
                 elif msg_type == "show_message":
+                    self.apply_pending_progress()
                     messagebox.showinfo(*args)
+                elif msg_type == "show_warning":
+                    self.apply_pending_progress()
+                    messagebox.showwarning(*args)
         except queue.Empty:
             pass
         finally:
-            self.root.after(100, self.check_queue)
+            self.append_log_lines(lines)
+            self.apply_pending_progress()
+            self.root.after(UI_UPDATE_INTERVAL_MS, self.check_queue)
+    
+    def apply_pending_progress(self):
+        """把后台线程最近一次报告的进度刷新到进度条"""
+        value, self.pending_progress = self.pending_progress, None
+        if value is not None:
+            self.update_progress(value)
     
     def queue_message(self, msg_type, *args):
-        """将消息放入队列"""
+        """将消息放入队列；进度只保留最新值，由 check_queue 定时刷新"""
+        if msg_type == "progress":
+            self.pending_progress = args[0]
+            return
         self.message_queue.put((msg_type, *args))
     
     def enable_buttons(self, enable=True):
@@ -186,195 +238,6 @@ class XLSXImageExtractorGUI:
         self.browse_output_btn.config(state=state)
         self.clear_btn.config(state=state)
     
-    def extract_cellimages_from_xlsx(self, xlsx_path):
-        """
-        从XML文件中提取xdr:cNvpr元素的name属性和a:blip元素的r:embed属性
-        返回元组列表 [(ID1, image1), (ID2, image2), ...]
-        """
-        # 定义XML命名空间
-        namespaces = {
-            'xdr': 'http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing',
-            'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
-            'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
-            'etc': 'http://www.wps.cn/officeDocument/2017/etCustomData'
-        }
-        
-        try:
-            with zipfile.ZipFile(xlsx_path, 'r') as z:
-                if 'xl/cellimages.xml' in z.namelist():
-                    with z.open('xl/cellimages.xml') as f:
-                        tree = ET.parse(f)
-                        root = tree.getroot()
-                        
-                        result = []
-                        
-                        # 查找所有etc:cellImage元素
-                        for cell_image in root.findall('etc:cellImage', namespaces):
-                            # 查找xdr:cNvPr元素并获取name属性
-                            c_nv_pr = cell_image.find('.//xdr:cNvPr', namespaces)
-                            name = c_nv_pr.get('name') if c_nv_pr is not None else None
-                            
-                            # 查找a:blip元素并获取r:embed属性
-                            blip = cell_image.find('.//a:blip', namespaces)
-                            embed = blip.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed') if blip is not None else None
-                            
-                            # get name and embed, remove 'rId' prefix from embed
-                            # get image name from rId
-                            if name is not None and embed is not None:
-                                rid = embed.removeprefix('rId')
-                                for fn in z.namelist():
-                                    if fn.startswith(f"xl/media/image{rid}."):
-                                        image_name = fn.removeprefix("xl/media/") 
-                                        result.append((name, image_name))
-                                        break
-                        
-                        return result
-            
-        except Exception as e:
-            self.queue_message("log", f"错误: {e}")
-            return []
-    
-    def extract_subdir_from_zip(self, zip_path: str, subdir: str, dest_dir: str):
-        """
-        Extract only the files inside 'subdir/' (or deeper) from the zip.
-        
-        Parameters:
-            zip_path  – path to the .zip file
-            subdir    – folder name inside the zip (e.g. "myfolder" or "path/to/myfolder")
-            dest_dir  – where to extract on disk
-        """
-        # Make sure subdir ends with '/' so we match is exact
-        if not subdir.endswith('/'):
-            subdir += '/'
-        
-        os.makedirs(dest_dir, exist_ok=True)
-        
-        with zipfile.ZipFile(zip_path, 'r') as zf:
-            files = [m for m in zf.namelist() if m.startswith(subdir)]
-            total_files = len(files)
-            
-            for idx, member in enumerate(files):
-                # Only extract files that are inside the desired subdirectory
-                if member.startswith(subdir):
-                    # Remove the leading subdir part so we don't create extra nesting
-                    target_path = os.path.join(dest_dir, member[len(subdir):])
-                    
-                    # If it's a directory entry (ends with '/'), create the dir
-                    if member.endswith('/'):
-                        os.makedirs(target_path, exist_ok=True)
-                    else:
-                        # Ensure parent directory exists
-                        os.makedirs(os.path.dirname(target_path), exist_ok=True)
-                        # Extract the file
-                        with zf.open(member) as source, open(target_path, "wb") as target:
-                            target.write(source.read())
-                    
-                    # 更新进度
-                    progress = (idx + 1) / total_files * 100
-                    self.queue_message("progress", progress)
-                    self.queue_message("log", f"提取文件: {member[len(subdir):]}")
-    
-    def create_csv(self, tuples_list, output_dir):
-        """创建CSV文件来存储提取的图像信息"""
-        try:
-            csv_path = os.path.abspath(os.path.join(output_dir, 'extracted_images.csv'))
-            
-            with open(csv_path, 'w') as csv:
-                # 写入CSV表头
-                csv.write('ID,img_path\n')
-                
-                # 遍历所有图像信息并写入CSV
-                for i, (ID, image) in enumerate(tuples_list):
-                    # 构建图像文件的完整路径
-                    img_path = os.path.abspath(os.path.join(output_dir, "media", image))
-                    
-                    # 处理Windows路径分隔符（将单个反斜杠替换为双反斜杠）
-                    if os.path.sep == "\\":
-                        img_path = f"{str(img_path).replace(os.sep, '\\\\')}"
-                    
-                    # 写入CSV行（使用双引号包裹字段值）
-                    csv.write(f'"{ID}","{img_path}"\n')
-            
-            self.queue_message("log", f"CSV文件已保存到 {csv_path}")
-            return True
-            
-        except Exception as e:
-            self.queue_message("log", f"创建CSV文件时出错: {e}")
-            return False
-    
-    def create_excel_worksheet(self, tuples_list, output_dir, media_dir):
-        """创建Excel工作表来存储提取的图像信息"""
-        try:
-            # 尝试导入openpyxl
-            import openpyxl
-            from openpyxl.styles import Font, Alignment, Border, Side
-            
-            excel_path = os.path.abspath(os.path.join(output_dir, 'extracted_images.xlsx'))
-            
-            # 创建工作簿和工作表
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "提取的图像"
-            
-            # 设置标题行
-            headers = ["序号", "图像名称", "图像文件", "完整路径", "提取时间"]
-            for col_idx, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col_idx, value=header)
-                cell.font = Font(bold=True)
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-            
-            # 添加数据行
-            from datetime import datetime
-            extract_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            for row_idx, (image_name, image_file) in enumerate(tuples_list, 2):
-                img_path = os.path.join(media_dir, image_file) if media_dir else image_file
-                full_path = os.path.abspath(img_path) if os.path.exists(img_path) else f"未找到: {img_path}"
-                
-                ws.cell(row=row_idx, column=1, value=row_idx-1)  # 序号
-                ws.cell(row=row_idx, column=2, value=image_name)  # 图像名称
-                ws.cell(row=row_idx, column=3, value=image_file)  # 图像文件
-                ws.cell(row=row_idx, column=4, value=full_path.replace("\\","\\\\"))   # 完整路径
-                ws.cell(row=row_idx, column=5, value=extract_time) # 提取时间
-            
-            # 调整列宽
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # 添加边框
-            thin_border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-            
-            for row in ws.iter_rows(min_row=1, max_row=len(tuples_list)+1, max_col=5):
-                for cell in row:
-                    cell.border = thin_border
-            
-            # 保存工作簿
-            wb.save(excel_path)
-            self.queue_message("log", f"Excel工作表保存到 {excel_path}")
-            return True
-            
-        except ImportError:
-            self.queue_message("log", "警告: openpyxl库未安装，无法创建Excel文件")
-            self.queue_message("log", "请使用以下命令安装: pip install openpyxl")
-            return False
-        except Exception as e:
-            self.queue_message("log", f"创建Excel文件时出错: {e}")
-            return False
-    
     def extraction_thread(self):
         """执行提取操作的线程函数"""
         try:
@@ -384,6 +247,10 @@ class XLSXImageExtractorGUI:
             create_csv = self.create_csv_var.get()
             create_excel = self.create_excel_var.get()
             extract_images = self.extract_images_var.get()
+            referenced_only = self.referenced_only_var.get()
+            locate_cells = self.locate_cells_var.get()
+            thumbnails = self.thumbnails_var.get()
+            save_log = self.save_log_var.get()
             
             # 验证输入
             if not xlsx_path or not os.path.exists(xlsx_path):
@@ -396,58 +263,49 @@ class XLSXImageExtractorGUI:
                 self.queue_message("enable_buttons", True)
                 return
             
-            # 创建输出目录
-            os.makedirs(output_dir, exist_ok=True)
-            
-            self.queue_message("status", "正在提取图像信息...")
-            self.queue_message("progress", 10)
-            
-            # 提取图像信息
-            tuples_list = self.extract_cellimages_from_xlsx(xlsx_path)
-            
-            if not tuples_list:
-                self.queue_message("log", "警告: 未找到任何图像")
-                self.queue_message("status", "完成 - 未找到图像")
-                self.queue_message("progress", 100)
-                self.queue_message("enable_buttons", True)
-                return
-            
-            self.queue_message("log", "提取的图像列表:")
-            self.queue_message("log", "[")
-            for i, (ID, rID) in enumerate(tuples_list):
-                self.queue_message("log", f'"{ID}","{rID}"')
-            self.queue_message("log", "]")
-            
-            self.queue_message("log", f"\n总共提取了 {len(tuples_list)} 个图像")
-            self.queue_message("progress", 30)
-            
-            # 创建CSV文件
-            if create_csv:
-                self.queue_message("status", "正在创建CSV文件...")
-                if self.create_csv(tuples_list, output_dir):
-                    self.queue_message("progress", 50)
+            report = self.queue_message
+            log_file = None
+            if save_log:
+                os.makedirs(output_dir, exist_ok=True)
+                log_file = open(os.path.join(output_dir, LOG_FILE_NAME), 'w', encoding='utf-8')
+                
+                def report(msg_type, *args):
+                    if msg_type == "log":
+                        log_file.write(args[0] + "\n")
+                    self.queue_message(msg_type, *args)
             
-            # 创建Excel工作表
-            if create_excel:
-                self.queue_message("status", "正在创建Excel工作表...")
-                media_dir =os.path.abspath(os.path.join(output_dir, 'media')) if extract_images else None
-                if self.create_excel_worksheet(tuples_list, output_dir, media_dir):
-                    self.queue_message("log", "Excel工作表创建成功")
-                self.queue_message("progress", 70)
+            # 各阶段结束时在日志中显示耗时
+            metrics = Metrics()
             
-            # 提取图像文件
-            if extract_images:
-                self.queue_message("status", "正在提取图像文件...")
-                media_dir = os.path.join(output_dir, 'media')
-                self.extract_subdir_from_zip(xlsx_path, 'xl/media', media_dir)
-                self.queue_message("log", f"图像文件已提取到 {media_dir}")
-                self.queue_message("progress", 90)
+            @metrics.subscribe
+            def on_stage(event, stage, data):
+                if event == "end":
+                    report("log", f"阶段 {stage} 完成: 耗时 {data['wall_seconds']:.2f} 秒, "
+                                  f"CPU {data['cpu_seconds']:.2f} 秒, {data['items']} 项")
             
-            # 完成
-            self.queue_message("status", f"完成 - 提取了 {len(tuples_list)} 个图像")
-            self.queue_message("progress", 100)
-            self.queue_message("log", "\n操作完成！")
-            self.queue_message("show_message", "完成", f"成功提取了 {len(tuples_list)} 个图像")
+            try:
+                result = run_extraction(
+                    xlsx_path, output_dir,
+                    create_csv_file=create_csv,
+                    create_excel=create_excel,
+                    extract_images=extract_images,
+                    referenced_only=referenced_only,
+                    locate_cells=locate_cells,
+                    thumbnail_size=THUMBNAIL_DEFAULT_SIZE if thumbnails else None,
+                    metrics=metrics,
+                    report=report,
+                )
+            finally:
+                if log_file is not None:
+                    log_file.close()
+                    self.queue_message("log", f"完整日志已保存到 {log_file.name}")
+            if not result.ok:
+                # 报告或缩略图未能生成（如Pillow未安装），详细原因见日志
+                self.queue_message("status", "完成 - 部分输出失败")
+                self.queue_message("show_warning", "部分失败",
+                                   f"提取了 {len(result.images)} 个图像，但部分输出未能生成，请查看日志")
+            elif result.images:
+                self.queue_message("show_message", "完成", f"成功提取了 {len(result.images)} 个图像")
             
         except Exception as e:
             self.queue_message("log", f"错误: {e}")
@@ -465,6 +323,7 @@ class XLSXImageExtractorGUI:
         self.clear_log()
         
         # 重置进度条
+        self.pending_progress = None
         self.progress_var.set(0)
         
         # 在后台线程中执行提取操作
@@ -472,6 +331,8 @@ class XLSXImageExtractorGUI:
         thread.start()
 
 def main():
+    # 打包为exe后，进程池（如生成缩略图）的子进程不重新启动界面
+    multiprocessing.freeze_support()
     root = tk.Tk()
     _app = XLSXImageExtractorGUI(root)
     root.mainloop()
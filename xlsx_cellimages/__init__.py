@@ -0,0 +1,67 @@
+"""
+XLSX单元格内嵌入图像提取引擎（无GUI依赖）
+
+导出的名称在首次访问时才导入所在的子模块：只用到 engine 中的函数时，不会
+加载批处理（multiprocessing）、归档（tarfile）等模块，定时任务启动更快。
+"""
+import importlib
+from typing import TYPE_CHECKING
+
+# {导出名称: 所在子模块}
+_EXPORTS = {
+    "ArchiveWriter": "archive",
+    "BatchItem": "batch",
+    "CellImage": "sheets",
+    "ExtractionResult": "engine",
+    "MediaStats": "engine",
+    "Metrics": "metrics",
+    "WorkbookSource": "engine",
+    "create_csv": "engine",
+    "create_excel_worksheet": "engine",
+    "extract_cellimages_from_xlsx": "engine",
+    "extract_subdir_from_zip": "engine",
+    "iter_cellimages": "engine",
+    "iter_cellimages_from_xlsx": "engine",
+    "iter_subdir_from_zip": "engine",
+    "read_cellimage_payloads": "engine",
+    "run_archive": "archive",
+    "run_batch": "batch",
+    "run_extraction": "pipeline",
+    "scan_sheets": "sheets",
+    "write_archive": "archive",
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from .archive import ArchiveWriter, run_archive, write_archive
+    from .batch import BatchItem, run_batch
+    from .engine import (
+        ExtractionResult,
+        MediaStats,
+        WorkbookSource,
+        create_csv,
+        create_excel_worksheet,
+        extract_cellimages_from_xlsx,
+        extract_subdir_from_zip,
+        iter_cellimages,
+        iter_cellimages_from_xlsx,
+        iter_subdir_from_zip,
+        read_cellimage_payloads,
+    )
+    from .metrics import Metrics
+    from .pipeline import run_extraction
+    from .sheets import CellImage, scan_sheets
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,178 @@
+"""
+命令行入口: python -m xlsx_cellimages [选项] 输入文件或通配符... -o 输出根目录
+
+每个工作簿的结果写入 输出根目录/<文件名>/ 下，汇总索引写入
+输出根目录/batch_index.csv。--metrics 把各工作簿分阶段的计时和读写量写成
+JSON或Prometheus textfile（扩展名为 .prom 时）。--archive 不在磁盘上展开结果，
+而是把图像文件和报告写入一个zip或tar（"-" 表示标准输出），此时不需要 -o。
+退出码: 0 全部成功；1 至少一个文件失败；2 参数错误或没有匹配的输入文件。
+"""
+import argparse
+import sys
+
+from .archive import ARCHIVE_FORMATS
+from .cli import EXIT_FAILED, EXIT_OK, EXIT_USAGE, expand_inputs, format_stats
+from .dedup import DEDUP_MODES
+from .thumbnails import THUMBNAIL_FORMATS, pillow_available
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m xlsx_cellimages",
+        description="从WPS导出的XLSX文件中提取单元格内嵌入的图像",
+    )
+    parser.add_argument("inputs", nargs="+", help="XLSX文件路径或通配符（如 'exports/**/*.xlsx'）")
+    parser.add_argument("-o", "--output", help="输出根目录（使用 --archive 时不需要）")
+    parser.add_argument("--archive", metavar="FILE",
+                        help="把图像文件和报告直接写入一个zip或tar归档，\"-\" 表示写到标准输出")
+    parser.add_argument("--archive-format", choices=ARCHIVE_FORMATS,
+                        help="归档格式（默认按扩展名推断，.tar 为tar，其他为zip）")
+    parser.add_argument("--csv", action="store_true", help="输出 extracted_images.csv")
+    parser.add_argument("--no-excel", action="store_true", help="不输出 extracted_images.xlsx")
+    parser.add_argument("--no-images", action="store_true", help="不提取图像文件到media目录")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="并行处理的进程数，0 表示使用全部CPU（默认: 1）")
+    parser.add_argument("--inflate-workers", type=int, default=1,
+                        help="每个工作簿提取图像文件时的解压线程数（默认: 1）")
+    parser.add_argument("--referenced-only", action="store_true",
+                        help="只提取cellimages.xml中被单元格引用的图像文件")
+    parser.add_argument("--name", dest="names", action="append", metavar="ID_...",
+                        help="只处理指定名称的图像，可重复使用（隐含 --referenced-only）")
+    parser.add_argument("--names-file", help="从文件读取图像名称列表，每行一个")
+    parser.add_argument("--dedup", choices=DEDUP_MODES,
+                        help="按内容去重：cas 报告直接指向去重存储中的文件；hardlink media目录中为硬链接")
+    parser.add_argument("--dedup-dir", help="去重存储目录（默认: 输出根目录/blobs，所有工作簿共用）")
+    parser.add_argument("--incremental", action="store_true",
+                        help="增量提取：跳过上次提取后未变化的图像文件（清单保存在各输出目录中）")
+    parser.add_argument("--cells", action="store_true",
+                        help="扫描工作表中的DISPIMG公式，输出图像所在单元格 extracted_cells.csv")
+    parser.add_argument("--key-column", default="A", metavar="COL",
+                        help="extracted_cells.csv 中行键取自的列（默认: A）")
+    parser.add_argument("--sheet-workers", type=int, default=1,
+                        help="每个工作簿并行扫描工作表的进程数（默认: 1）")
+    parser.add_argument("--thumbnail-size", type=int, metavar="PX",
+                        help="把最长边超过PX像素的图像缩小后写入各输出目录的thumbnails目录（需要Pillow）")
+    parser.add_argument("--thumbnail-format", choices=THUMBNAIL_FORMATS,
+                        help="缩略图格式（默认保持原格式）")
+    parser.add_argument("--thumbnail-workers", type=int, default=0,
+                        help="生成缩略图的进程数，0 表示使用全部CPU（默认: 0）")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="写出分阶段指标：.prom 为Prometheus textfile格式，其他扩展名为JSON")
+    parser.add_argument("--profile", action="store_true",
+                        help="启用cProfile，结果写入各输出目录的 extract_profile.prof")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", action="store_true", help="输出详细日志")
+    verbosity.add_argument("-q", "--quiet", action="store_true", help="仅输出错误")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        print("错误: 没有匹配的XLSX文件", file=sys.stderr)
+        return EXIT_USAGE
+
+    if not args.output and not args.archive:
+        print("错误: 需要 -o 输出根目录或 --archive 归档文件", file=sys.stderr)
+        return EXIT_USAGE
+
+    if args.archive and (args.dedup or args.incremental):
+        print("错误: --archive 不能与 --dedup 或 --incremental 同时使用", file=sys.stderr)
+        return EXIT_USAGE
+
+    if args.thumbnail_size is not None:
+        if args.archive or args.no_images:
+            print("错误: --thumbnail-size 不能与 --archive 或 --no-images 同时使用", file=sys.stderr)
+            return EXIT_USAGE
+        if args.thumbnail_size < 1 or args.thumbnail_workers < 0:
+            print("错误: --thumbnail-size 至少为1，--thumbnail-workers 不能为负数", file=sys.stderr)
+            return EXIT_USAGE
+        if not pillow_available():
+            print("错误: 生成缩略图需要Pillow，请使用以下命令安装: pip install pillow", file=sys.stderr)
+            return EXIT_USAGE
+
+    if args.workers < 0 or args.inflate_workers < 1 or args.sheet_workers < 1:
+        print("错误: --workers 不能为负数，--inflate-workers 和 --sheet-workers 至少为1", file=sys.stderr)
+        return EXIT_USAGE
+
+    if not args.key_column.isalpha():
+        print("错误: --key-column 应为列字母，如 A", file=sys.stderr)
+        return EXIT_USAGE
+
+    names = None
+    if args.names or args.names_file:
+        names = set(args.names or [])
+        if args.names_file:
+            with open(args.names_file, encoding='utf-8-sig') as f:
+                names.update(line.strip() for line in f if line.strip())
+
+    failed = 0
+    # 归档写到标准输出时，进度信息改写到标准错误
+    out = sys.stderr if args.archive == '-' else sys.stdout
+
+    def report(msg_type, *msg_args):
+        nonlocal failed
+        if msg_type == "log" and args.verbose:
+            print(*msg_args, file=sys.stderr)
+        elif msg_type == "done":
+            item = msg_args[0]
+            if item.error is not None:
+                failed += 1
+                print(f"失败: {item.xlsx_path}: {item.error}", file=sys.stderr)
+            elif not item.ok:
+                failed += 1
+                print(f"失败: {item.xlsx_path}: 生成报告时出错", file=sys.stderr)
+            elif not args.quiet:
+                destination = item.output_dir
+                if args.archive:
+                    destination = f"{args.archive}:{item.output_dir}" if item.output_dir else args.archive
+                print(f"{item.xlsx_path}: 提取了 {len(item.result.images)} 个图像 -> {destination}"
+                      f"{format_stats(item.result)}", file=out)
+
+    options = dict(
+        create_csv_file=args.csv,
+        create_excel=not args.no_excel,
+        extract_images=not args.no_images,
+        referenced_only=args.referenced_only,
+        names=names,
+        locate_cells=args.cells,
+        key_column=args.key_column.upper(),
+    )
+    # 归档、批处理和指标模块只在用到时导入，定时任务中的单次运行启动更快
+    if args.archive:
+        from .archive import run_archive
+
+        # 归档只能顺序写入，按输入顺序逐个处理
+        items = run_archive(paths, args.archive, args.archive_format, report=report, **options)
+    else:
+        from .batch import run_batch
+
+        items = run_batch(
+            paths, args.output,
+            workers=args.workers,
+            report=report,
+            inflate_workers=args.inflate_workers,
+            dedup=args.dedup,
+            dedup_dir=args.dedup_dir,
+            incremental=args.incremental,
+            sheet_workers=args.sheet_workers,
+            thumbnail_size=args.thumbnail_size,
+            thumbnail_format=args.thumbnail_format,
+            thumbnail_workers=args.thumbnail_workers,
+            profile=args.profile,
+            **options,
+        )
+
+    if args.metrics:
+        from .metrics import write_metrics
+
+        write_metrics(args.metrics, [({'workbook': item.xlsx_path}, item.result.metrics)
+                                     for item in items if item.result is not None and item.result.metrics])
+
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
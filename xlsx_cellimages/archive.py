@@ -0,0 +1,271 @@
+"""
+归档输出：把图像文件和报告直接写入一个zip或tar流
+
+在网络共享上逐个创建成千上万个小文件时，文件系统元数据操作是主要开销。
+归档模式不在磁盘上展开media目录，而是把选中的图像成员和生成的CSV/Excel
+报告顺序写入单个zip或tar。PNG、JPEG等本身已压缩的格式在zip中以存储方式
+写入，不再重复压缩。目标可以是文件路径、"-"（标准输出）或任意可写的
+二进制文件对象，不要求可定位，便于通过管道上传到对象存储。
+
+报告写在归档中各工作簿目录的最前面，其中的图像路径为相对于报告的路径
+（media/image1.png），解包后即可直接使用。
+"""
+import os
+import posixpath
+import sys
+import time
+import zipfile
+
+from .batch import BatchItem, output_dirs_for
+from .engine import (
+    CELLIMAGES_PART,
+    COPY_BUFFER_SIZE,
+    MEDIA_PREFIX,
+    ExtractionResult,
+    MediaStats,
+    WorkbookSource,
+    _copy_stream,
+    _iter_cellimages_in,
+    _noop,
+    create_csv,
+    create_excel_worksheet,
+    peak_rss_bytes,
+)
+from .metrics import Metrics
+from .sheets import CELLS_CSV_NAME, create_cells_csv, scan_sheets
+
+ARCHIVE_FORMATS = ('zip', 'tar')
+
+# 本身已压缩的格式，写入zip时不再压缩
+STORED_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.gif', '.webp', '.zip', '.xlsx', '.gz'})
+
+
+def archive_format_for(target):
+    """按目标文件名推断归档格式，无法推断时为zip"""
+    name = target if isinstance(target, (str, os.PathLike)) else getattr(target, 'name', '')
+    return 'tar' if isinstance(name, (str, os.PathLike)) and os.fspath(name).endswith('.tar') else 'zip'
+
+
+class ArchiveWriter:
+    """
+    顺序写入的zip或tar归档
+
+    Parameters:
+        target  – 文件路径、"-"（标准输出）或可写的二进制文件对象（可以不支持定位）
+        fmt     – "zip" 或 "tar"，默认按目标文件名推断
+
+    关闭时只关闭自己打开的文件，调用者传入的文件对象和标准输出保持打开。
+    """
+
+    def __init__(self, target, fmt=None):
+        self.format = fmt or archive_format_for(target)
+        if self.format not in ARCHIVE_FORMATS:
+            raise ValueError(f"未知的归档格式: {self.format}")
+        self._owned = None
+        if isinstance(target, str) and target == '-':
+            fileobj = sys.stdout.buffer
+        elif isinstance(target, (str, os.PathLike)):
+            fileobj = self._owned = open(target, 'wb')
+        else:
+            fileobj = target
+        self._fileobj = fileobj
+        self._zip = self._tar = None
+        if self.format == 'zip':
+            self._zip = zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED)
+        else:
+            # tarfile只在写tar时导入，命令行入口不必为 ARCHIVE_FORMATS 加载它
+            import tarfile
+
+            # 流模式，不回写已输出的数据
+            self._tar = tarfile.open(fileobj=fileobj, mode='w|', format=tarfile.PAX_FORMAT)
+        self._buf = bytearray(COPY_BUFFER_SIZE)
+        self.entries = 0
+        self.bytes_written = 0
+
+    def add_stream(self, arcname, source, size, date_time=None):
+        """
+        从 source 流式写入一个成员，返回写入的（未压缩）字节数
+
+        size 为成员的未压缩大小（tar头需要预先写出大小，zip据此决定是否使用ZIP64），
+        date_time 为 (年, 月, 日, 时, 分, 秒)，默认当前时间。
+        """
+        date_time = tuple(date_time or time.localtime()[:6])
+        if self._zip is not None:
+            info = zipfile.ZipInfo(arcname, date_time)
+            info.file_size = size
+            if posixpath.splitext(arcname)[1].lower() in STORED_EXTENSIONS:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            with self._zip.open(info, 'w') as target:
+                written = _copy_stream(source, target, self._buf)
+        else:
+            import tarfile
+
+            info = tarfile.TarInfo(arcname)
+            info.size = size
+            info.mtime = int(time.mktime(date_time + (0, 0, -1)))
+            self._tar.addfile(info, source)
+            written = size
+        self.entries += 1
+        self.bytes_written += written
+        return written
+
+    def add_file(self, arcname, path):
+        """把磁盘上的文件写入归档"""
+        with open(path, 'rb') as f:
+            return self.add_stream(arcname, f, os.path.getsize(path), time.localtime(os.path.getmtime(path))[:6])
+
+    def close(self):
+        try:
+            if self._zip is not None:
+                self._zip.close()
+            else:
+                self._tar.close()
+            self._fileobj.flush()
+        finally:
+            if self._owned is not None:
+                self._owned.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def write_archive(xlsx_path, writer, prefix='', create_csv_file=False, create_excel=True,
+                  extract_images=True, referenced_only=False, names=None, locate_cells=False,
+                  key_column='A', metrics=None, on_index=None, report=None):
+    """
+    把一个工作簿的提取结果写入 writer（ArchiveWriter），成员位于 prefix 之下
+
+    选项与 run_extraction 相同。报告先写入临时目录再加入归档，图像成员从工作簿
+    中流式复制，不在磁盘上落地。返回的 ExtractionResult 中各路径为归档内的路径。
+    xlsx_path 也可以是 bytes/memoryview 或已打开的可定位二进制文件对象。
+    on_index 为可选回调 on_index(result, media)：解析完成后、向归档写入任何成员
+    之前调用，result.images 为 (ID, image) 列表，media 为将要写入的图像文件名
+    列表（如HTTP服务先返回JSON索引，再返回归档）。
+    """
+    report = report or _noop
+    metrics = metrics or Metrics()
+    result = ExtractionResult(xlsx_path=xlsx_path, output_dir=prefix)
+    if names is not None:
+        names = set(names)
+        referenced_only = True
+
+    report("status", "正在提取图像信息...")
+    report("progress", 10)
+
+    with WorkbookSource(xlsx_path) as source, source.open() as zf:
+        result.xlsx_path = source.name
+        with metrics.stage("parse") as stage:
+            infos = {info.filename: info for info in zf.infolist()}
+            if CELLIMAGES_PART not in infos:
+                report("log", "警告: 未找到任何图像")
+                report("status", "完成 - 未找到图像")
+                report("progress", 100)
+                result.metrics = metrics.summary()
+                if on_index is not None:
+                    on_index(result, [])
+                return result
+            members = list(infos)
+            records = list(_iter_cellimages_in(zf, names))
+            stage.add(items=len(records), bytes_read=infos[CELLIMAGES_PART].file_size)
+        result.images = records
+        report("log", f"总共提取了 {len(records)} 个图像")
+
+        # 选中的图像文件，保持在工作簿中的顺序
+        if not extract_images:
+            selected = []
+        elif referenced_only:
+            selected = list(dict.fromkeys(image for _, image in records))
+        else:
+            selected = [m.removeprefix(MEDIA_PREFIX) for m in members if m.startswith(MEDIA_PREFIX)]
+        paths = {image: f"media/{image}" for image in selected}
+        if on_index is not None:
+            on_index(result, selected)
+
+        import tempfile
+
+        with metrics.stage("reports") as stage, tempfile.TemporaryDirectory(prefix='xlsx_cellimages-') as tmp:
+            reports = []
+            if create_csv_file:
+                if create_csv(records, tmp, report, paths):
+                    reports.append('extracted_images.csv')
+                else:
+                    result.ok = False
+            if create_excel:
+                if create_excel_worksheet(records, tmp, None, report, set(selected), paths):
+                    reports.append('extracted_images.xlsx')
+                else:
+                    result.ok = False
+            if locate_cells:
+                cells = scan_sheets(zf, dict(records), key_column, report=report)
+                result.cells = cells
+                if create_cells_csv(cells, tmp, 'media', report, paths):
+                    reports.append(CELLS_CSV_NAME)
+                else:
+                    result.ok = False
+            for name in reports:
+                stage.add(items=1, bytes_written=writer.add_file(prefix + name, os.path.join(tmp, name)))
+                report("log", f"已写入归档: {prefix}{name}")
+        if 'extracted_images.csv' in reports:
+            result.csv_path = prefix + 'extracted_images.csv'
+        if 'extracted_images.xlsx' in reports:
+            result.excel_path = prefix + 'extracted_images.xlsx'
+        if CELLS_CSV_NAME in reports:
+            result.cells_csv_path = prefix + CELLS_CSV_NAME
+
+        if selected:
+            stats = MediaStats(files=len(selected))
+            start = time.perf_counter()
+            with metrics.stage("media") as stage:
+                for count, image in enumerate(selected, 1):
+                    info = infos[MEDIA_PREFIX + image]
+                    with zf.open(info) as source:
+                        stats.bytes_written += writer.add_stream(f"{prefix}media/{image}", source,
+                                                                 info.file_size, info.date_time)
+                    stage.add(items=1, bytes_read=info.compress_size)
+                    report("progress", 10 + count / len(selected) * 90)
+                    report("log", f"提取文件: {image}")
+                stage.add(bytes_written=stats.bytes_written)
+            stats.seconds = time.perf_counter() - start
+            result.media_dir = prefix + 'media'
+            result.media_stats = stats
+            report("log", f"共 {stats.files} 个文件, {stats.bytes_written / 1048576:.1f} MB, "
+                          f"{stats.bytes_per_sec / 1048576:.1f} MB/s")
+
+    result.peak_rss = peak_rss_bytes()
+    result.metrics = metrics.summary()
+    report("status", f"完成 - 提取了 {len(records)} 个图像")
+    report("progress", 100)
+    return result
+
+
+def run_archive(paths, target, fmt=None, report=None, **options):
+    """
+    把多个工作簿的提取结果顺序写入同一个归档
+
+    只有一个工作簿时成员位于归档根目录，否则各自位于以文件名命名的目录下
+    （同名文件追加序号，与批处理的输出目录一致）。单个文件失败不影响其他文件。
+    report 接收引擎的全部消息以及每个文件完成后的 ("done", BatchItem) 消息。
+    返回与 paths 顺序一致的 BatchItem 列表。
+    """
+    report = report or _noop
+    if len(paths) == 1:
+        prefixes = ['']
+    else:
+        prefixes = [os.path.basename(d) + '/' for d in output_dirs_for(paths, '')]
+    items = []
+    with ArchiveWriter(target, fmt) as writer:
+        for path, prefix in zip(paths, prefixes):
+            try:
+                result = write_archive(path, writer, prefix, report=report, **options)
+                item = BatchItem(path, prefix, result=result)
+            except Exception as e:
+                item = BatchItem(path, prefix, error=f"{type(e).__name__}: {e}")
+            items.append(item)
+            report("done", item)
+    return items
@@ -0,0 +1,179 @@
+"""
+多工作簿并行批处理
+
+以整个工作簿为单位分发到进程池，绕开GIL对解压和XML解析的限制。
+每个工作簿写入独立的输出子目录，单个文件失败不影响其他文件；全部完成后
+在输出根目录生成汇总索引 batch_index.csv 和 batch_status.csv。
+"""
+import csv
+import os
+from collections import deque
+from dataclasses import dataclass
+
+from .engine import ExtractionResult, _noop
+from .metrics import Metrics
+from .pipeline import run_extraction
+
+BATCH_INDEX_NAME = 'batch_index.csv'
+BATCH_STATUS_NAME = 'batch_status.csv'
+PROFILE_NAME = 'extract_profile.prof'
+
+
+@dataclass
+class BatchItem:
+    """批处理中单个工作簿的结果"""
+    xlsx_path: str
+    output_dir: str
+    result: ExtractionResult | None = None
+    error: str | None = None
+
+    @property
+    def ok(self):
+        return self.error is None and self.result is not None and self.result.ok
+
+
+def output_dirs_for(paths, output_root):
+    """
+    为每个输入文件分配独立的输出子目录，同名文件（不区分大小写）追加序号
+
+    追加序号后的名称也不与其他文件的名称重复（如 a.xlsx、a.xlsx、a_2.xlsx）。
+    """
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    # Windows和macOS的文件系统默认不区分大小写，按 casefold 后的名称判断重复
+    taken = {stem.casefold() for stem in stems}
+    counts = {}
+    used = set()
+    dirs = []
+    for stem in stems:
+        name = stem
+        if name.casefold() in used:
+            key = stem.casefold()
+            count = counts.get(key, 1)
+            while name.casefold() in used or name.casefold() in taken:
+                count += 1
+                name = f"{stem}_{count}"
+            counts[key] = count
+        used.add(name.casefold())
+        dirs.append(os.path.join(output_root, name))
+    return dirs
+
+
+def _extract_one(xlsx_path, output_dir, options, report=None):
+    """进程池中执行的单文件任务，异常转为错误信息返回"""
+    options = dict(options)
+    metrics = Metrics(profile=options.pop('profile', False))
+    try:
+        result = run_extraction(xlsx_path, output_dir, metrics=metrics, report=report, **options)
+        if metrics.profile:
+            metrics.dump_profile(os.path.join(output_dir, PROFILE_NAME))
+        return BatchItem(xlsx_path, output_dir, result=result)
+    except Exception as e:
+        return BatchItem(xlsx_path, output_dir, error=f"{type(e).__name__}: {e}")
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def run_batch(paths, output_root, workers=1, report=None, **options):
+    """
+    批量提取多个工作簿
+
+    Parameters:
+        paths        – 工作簿路径列表
+        output_root  – 输出根目录，每个工作簿写入其下的独立子目录
+        workers      – 进程数；1 表示在当前进程顺序执行，None 或 0 表示使用全部CPU
+        report       – 可选回调；顺序执行时接收引擎的全部消息，
+                       并行时只接收每个文件完成后的 ("done", BatchItem) 消息
+        options      – 传给 run_extraction 的选项（create_csv_file 等）；启用去重时
+                       默认所有工作簿共用 output_root/blobs 存储目录；
+                       profile=True 时在每个输出目录写入cProfile结果 extract_profile.prof
+
+    返回与 paths 顺序一致的 BatchItem 列表。
+    """
+    report = report or _noop
+    os.makedirs(output_root, exist_ok=True)
+    if options.get('dedup') and not options.get('dedup_dir'):
+        options['dedup_dir'] = os.path.join(output_root, 'blobs')
+    jobs = list(zip(paths, output_dirs_for(paths, output_root)))
+    results = [None] * len(jobs)
+
+    if not workers:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs)))
+
+    if workers == 1:
+        for idx, (path, output_dir) in enumerate(jobs):
+            results[idx] = _extract_one(path, output_dir, options, report)
+            report("done", results[idx])
+    else:
+        # multiprocessing较重，只在并行处理时导入
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+        from concurrent.futures.process import BrokenProcessPool
+
+        # 大文件先提交，减少尾部只剩一个大文件在跑的情况
+        pending = deque(sorted(range(len(jobs)), key=lambda i: _file_size(jobs[i][0]), reverse=True))
+        # 同时只提交 workers 个任务，工作进程异常退出时只影响正在运行的任务
+        running = {}
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            while pending or running:
+                while pending and len(running) < workers:
+                    idx = pending.popleft()
+                    running[pool.submit(_extract_one, *jobs[idx], options)] = idx
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                    # 工作进程异常退出（如内存不足被终止）时，进程池中正在运行的任务全部失败，
+                    # 无法区分是哪个文件导致的；记为失败后重建进程池继续处理其余文件
+                    done = list(running)
+                    pool.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(max_workers=workers)
+                for future in done:
+                    idx = running.pop(future)
+                    try:
+                        results[idx] = future.result()
+                    except BrokenProcessPool:
+                        results[idx] = BatchItem(*jobs[idx], error="工作进程异常退出")
+                    report("done", results[idx])
+        finally:
+            pool.shutdown(wait=True)
+
+    write_batch_index(results, output_root)
+    return results
+
+
+def write_batch_index(items, output_root):
+    """写入跨工作簿的汇总索引和每个工作簿的处理状态"""
+    index_path = os.path.join(output_root, BATCH_INDEX_NAME)
+    with open(index_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['workbook', 'ID', 'image', 'img_path'])
+        for item in items:
+            if item.result is None:
+                continue
+            media_dir = item.result.media_dir or os.path.abspath(os.path.join(item.output_dir, 'media'))
+            paths = item.result.image_paths or {}
+            for name, image in item.result.images:
+                writer.writerow([item.xlsx_path, name, image, paths.get(image) or os.path.join(media_dir, image)])
+
+    status_path = os.path.join(output_root, BATCH_STATUS_NAME)
+    with open(status_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['workbook', 'output_dir', 'status', 'images', 'media_bytes', 'media_bytes_per_sec',
+                         'excel_rows_per_sec', 'peak_rss', 'error'])
+        for item in items:
+            result = item.result
+            stats = result.media_stats if result is not None else None
+            writer.writerow([
+                item.xlsx_path, item.output_dir, 'ok' if item.ok else 'failed',
+                len(result.images) if result is not None else 0,
+                stats.bytes_written if stats is not None else '',
+                round(stats.bytes_per_sec) if stats is not None else '',
+                round(result.excel_rows_per_sec) if result is not None and result.excel_rows_per_sec is not None else '',
+                result.peak_rss if result is not None and result.peak_rss is not None else '',
+                item.error or '',
+            ])
+    return index_path
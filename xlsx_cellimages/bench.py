@@ -0,0 +1,364 @@
+"""
+基准测试: python -m xlsx_cellimages.bench [选项]
+
+生成模拟WPS导出格式的xlsx（带 etc:cellImage 的 xl/cellimages.xml），分别计时
+cellimages.xml 解析、rId解析、图像提取、CSV和Excel报告生成以及完整流水线，
+输出JSON结果。使用 --compare 与之前的结果比较，任一阶段耗时超过阈值时返回1。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+from .engine import (
+    CELLIMAGES_PART,
+    CELLIMAGES_RELS_PART,
+    MEDIA_DIR,
+    NAMESPACES,
+    create_csv,
+    create_excel_worksheet,
+    extract_subdir_from_zip,
+    iter_cellimages,
+    media_stem_index,
+    peak_rss_bytes,
+    read_relationships,
+    resolve_embed,
+)
+from .pipeline import run_extraction
+from .sheets import scan_sheets
+
+# rId与图像文件编号的对应方式
+LAYOUTS = ('aligned', 'shuffled', 'norels')
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _image_name(n):
+    """与WPS相同的图像名称格式: ID_ + 32位十六进制"""
+    return f"ID_{n:032X}"
+
+
+def make_workbook(path, images=1000, image_size=4096, duplicate_ratio=0.0, layout='aligned',
+                  orphan_media=0, seed=0):
+    """
+    生成一个模拟WPS收集表导出的xlsx文件
+
+    Parameters:
+        images           – etc:cellImage 条目数
+        image_size       – 每个图像文件的字节数
+        duplicate_ratio  – 内容与其他图像完全相同的图像比例（0~1）
+        layout           – "aligned": rIdN 对应 imageN；"shuffled": rels中rId与编号错开；
+                           "norels": 不写关系部件，按rId编号查找图像
+        orphan_media     – 未被单元格引用的额外图像文件数（浮动图片、图表等）
+        seed             – 随机数种子，相同参数生成相同文件
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"未知的layout: {layout}")
+    rng = random.Random(seed)
+    total_media = images + orphan_media
+    numbers = list(range(1, total_media + 1))
+    if layout == 'shuffled':
+        rng.shuffle(numbers)
+    unique = max(1, round(images * (1 - duplicate_ratio)))
+
+    def payload(i):
+        # 前 unique 个图像内容各不相同，其余重复使用其中之一
+        key = i if i < unique or i >= images else rng.randrange(unique)
+        body = random.Random(seed * 1_000_003 + key).randbytes(max(0, image_size - len(_PNG_SIGNATURE)))
+        return _PNG_SIGNATURE + body
+
+    ns = ' '.join(f'xmlns:{prefix}="{uri}"' for prefix, uri in NAMESPACES.items())
+    sheet_ns = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('[Content_Types].xml',
+                   '<?xml version="1.0" encoding="UTF-8"?>'
+                   '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                   '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                   '<Default Extension="xml" ContentType="application/xml"/>'
+                   '<Default Extension="png" ContentType="image/png"/>'
+                   '<Override PartName="/xl/workbook.xml" '
+                   'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                   '<Override PartName="/xl/worksheets/sheet1.xml" '
+                   'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                   '</Types>')
+        z.writestr('_rels/.rels',
+                   '<?xml version="1.0" encoding="UTF-8"?>'
+                   '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                   '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                   'relationships/officeDocument" Target="xl/workbook.xml"/></Relationships>')
+        z.writestr('xl/workbook.xml',
+                   f'<?xml version="1.0" encoding="UTF-8"?><workbook xmlns="{sheet_ns}" '
+                   f'xmlns:r="{NAMESPACES["r"]}"><sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/>'
+                   '</sheets></workbook>')
+        z.writestr('xl/_rels/workbook.xml.rels',
+                   '<?xml version="1.0" encoding="UTF-8"?>'
+                   '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                   '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                   'relationships/worksheet" Target="worksheets/sheet1.xml"/></Relationships>')
+
+        with z.open(CELLIMAGES_PART, 'w') as f:
+            f.write(f'<?xml version="1.0" encoding="UTF-8"?><etc:cellImages {ns}>'.encode())
+            for i in range(images):
+                rid = i + 1
+                f.write(('<etc:cellImage><xdr:pic><xdr:nvPicPr>'
+                         f'<xdr:cNvPr id="{rid}" name="{_image_name(rid)}" descr=""/><xdr:cNvPicPr/>'
+                         '</xdr:nvPicPr><xdr:blipFill>'
+                         f'<a:blip r:embed="rId{rid}"/><a:stretch><a:fillRect/></a:stretch>'
+                         '</xdr:blipFill><xdr:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="0" cy="0"/>'
+                         '</a:xfrm><a:prstGeom prst="rect"><a:avLst/></a:prstGeom></xdr:spPr>'
+                         '</xdr:pic></etc:cellImage>').encode())
+            f.write(b'</etc:cellImages>')
+
+        if layout != 'norels':
+            with z.open(CELLIMAGES_RELS_PART, 'w') as f:
+                f.write(b'<?xml version="1.0" encoding="UTF-8"?>'
+                        b'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">')
+                for i in range(images):
+                    f.write((f'<Relationship Id="rId{i + 1}" Type="http://schemas.openxmlformats.org/'
+                             f'officeDocument/2006/relationships/image" '
+                             f'Target="media/image{numbers[i]}.png"/>').encode())
+                f.write(b'</Relationships>')
+
+        with z.open('xl/worksheets/sheet1.xml', 'w') as f:
+            f.write(f'<?xml version="1.0" encoding="UTF-8"?><worksheet xmlns="{sheet_ns}"><sheetData>'.encode())
+            for i in range(images):
+                row = i + 2
+                name = _image_name(i + 1)
+                f.write((f'<row r="{row}"><c r="A{row}"><v>{i + 1}</v></c>'
+                         f'<c r="B{row}" t="str"><f>_xlfn.DISPIMG("{name}",1)</f>'
+                         f'<v>=DISPIMG("{name}",1)</v></c></row>').encode())
+            f.write(b'</sheetData></worksheet>')
+
+        # 图像文件按编号写入；norels布局下rIdN必须对应imageN
+        image_of = {numbers[i]: i for i in range(total_media)} if layout != 'norels' else None
+        for number in range(1, total_media + 1):
+            index = image_of[number] if image_of is not None else number - 1
+            z.writestr(f'{MEDIA_DIR}/image{number}.png', payload(index))
+    return path
+
+
+class _Measure:
+    """测量一个阶段的墙钟时间、CPU时间和内存峰值"""
+
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = time.perf_counter() - self.wall
+        self.cpu = time.process_time() - self.cpu
+        self.traced_peak = None
+        if self.trace_memory:
+            self.traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.peak_rss = peak_rss_bytes()
+        return False
+
+    def as_dict(self, items, nbytes=None):
+        data = {
+            'wall_seconds': round(self.wall, 6),
+            'cpu_seconds': round(self.cpu, 6),
+            'items': items,
+            'items_per_sec': round(items / self.wall, 1) if self.wall > 0 else None,
+            'peak_rss': self.peak_rss,
+        }
+        if nbytes is not None:
+            data['bytes'] = nbytes
+            data['bytes_per_sec'] = round(nbytes / self.wall) if self.wall > 0 else None
+        if self.traced_peak is not None:
+            data['traced_peak'] = self.traced_peak
+        return data
+
+
+def run_benchmark(xlsx_path, work_dir, trace_memory=False, inflate_workers=1):
+    """对一个工作簿逐阶段计时，返回 {阶段名: 指标}"""
+    stages = {}
+
+    with zipfile.ZipFile(xlsx_path) as z:
+        with _Measure(trace_memory) as m:
+            with z.open(CELLIMAGES_PART) as f:
+                entries = list(iter_cellimages(f))
+        stages['parse_cellimages'] = m.as_dict(len(entries), z.getinfo(CELLIMAGES_PART).file_size)
+
+        with _Measure(trace_memory) as m:
+            names = z.namelist()
+            rels = read_relationships(z, names)
+            stem_index = media_stem_index(names)
+            records = []
+            for name, embed in entries:
+                image = resolve_embed(embed, rels, stem_index)
+                if image is not None:
+                    records.append((name, image))
+        stages['resolve_rids'] = m.as_dict(len(records))
+
+        with _Measure(trace_memory) as m:
+            cells = scan_sheets(z, dict(records))
+        stages['scan_sheets'] = m.as_dict(len(cells), sum(
+            info.file_size for info in z.infolist() if info.filename.startswith('xl/worksheets/')))
+
+    media_dir = os.path.join(work_dir, 'media')
+    with _Measure(trace_memory) as m:
+        media = extract_subdir_from_zip(xlsx_path, MEDIA_DIR, media_dir, workers=inflate_workers)
+    stages['extract_media'] = m.as_dict(media.files, media.bytes_written)
+
+    with _Measure(trace_memory) as m:
+        create_csv(records, work_dir)
+    stages['write_csv'] = m.as_dict(len(records), os.path.getsize(os.path.join(work_dir, 'extracted_images.csv')))
+
+    extracted = {image for _, image in records}
+    with _Measure(trace_memory) as m:
+        ok = create_excel_worksheet(records, work_dir, os.path.abspath(media_dir), extracted=extracted)
+    if ok:
+        stages['write_excel'] = m.as_dict(len(records))
+
+    with _Measure(trace_memory) as m:
+        result = run_extraction(xlsx_path, os.path.join(work_dir, 'pipeline'), create_csv_file=True,
+                                create_excel=ok, inflate_workers=inflate_workers)
+    stages['pipeline'] = m.as_dict(len(result.images), result.media_stats.bytes_written)
+    return stages
+
+
+def _git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def mismatches(current, baseline):
+    """返回与基线不一致、导致结果不可比较的项 [(名称, 基线值, 当前值)]"""
+    diffs = [(key, baseline.get(key), current[key]) for key in ('python', 'cpu_count')
+             if baseline.get(key) != current[key]]
+    base_params = baseline.get('params', {})
+    for key in sorted(set(current['params']) | set(base_params)):
+        if base_params.get(key) != current['params'].get(key):
+            diffs.append((f"params.{key}", base_params.get(key), current['params'].get(key)))
+    return diffs
+
+
+def compare(current, baseline, threshold):
+    """返回耗时比基线慢超过 threshold（比例）的阶段列表 [(阶段, 基线秒数, 当前秒数)]"""
+    regressions = []
+    for stage, metrics in current['stages'].items():
+        base = baseline.get('stages', {}).get(stage)
+        if not base or not base.get('wall_seconds'):
+            continue
+        if metrics['wall_seconds'] > base['wall_seconds'] * (1 + threshold):
+            regressions.append((stage, base['wall_seconds'], metrics['wall_seconds']))
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m xlsx_cellimages.bench",
+                                     description="生成模拟工作簿并对各提取阶段计时")
+    parser.add_argument("--images", type=int, default=5000, help="etc:cellImage 条目数（默认: 5000）")
+    parser.add_argument("--image-size", type=int, default=8192, help="每个图像的字节数（默认: 8192）")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="重复图像比例 0~1（默认: 0）")
+    parser.add_argument("--layout", choices=LAYOUTS, default='aligned', help="rId与图像编号的对应方式")
+    parser.add_argument("--orphan-media", type=int, default=0, help="未被引用的额外图像数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--inflate-workers", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1, help="重复次数，每个阶段取最快的一次")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="用tracemalloc记录每个阶段的Python内存峰值（会明显变慢）")
+    parser.add_argument("--workbook", help="使用已有的xlsx文件，不生成模拟工作簿")
+    parser.add_argument("--keep", action="store_true", help="保留生成的文件和输出目录")
+    parser.add_argument("-o", "--output", help="JSON结果写入的文件（默认输出到标准输出）")
+    parser.add_argument("--compare", help="与之前的JSON结果比较（参数、Python版本和CPU数须与之相同）")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定为退化的耗时增幅（默认: 0.2）")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    results = {
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': {
+            'workbook': args.workbook,
+            'images': args.images,
+            'image_size': args.image_size,
+            'duplicate_ratio': args.duplicate_ratio,
+            'layout': args.layout,
+            'orphan_media': args.orphan_media,
+            'seed': args.seed,
+            'inflate_workers': args.inflate_workers,
+            'repeat': args.repeat,
+        },
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        # 参数或环境不同的结果之间没有可比性，在运行之前拒绝
+        diffs = mismatches(results, baseline)
+        if diffs:
+            for key, before, after in diffs:
+                print(f"错误: {key} 与基线不同: {before!r} -> {after!r}", file=sys.stderr)
+            return 2
+
+    work_root = tempfile.mkdtemp(prefix="xlsx_cellimages_bench_")
+
+    if args.workbook:
+        xlsx_path = args.workbook
+    else:
+        xlsx_path = os.path.join(work_root, 'synthetic.xlsx')
+        start = time.perf_counter()
+        make_workbook(xlsx_path, images=args.images, image_size=args.image_size,
+                      duplicate_ratio=args.duplicate_ratio, layout=args.layout,
+                      orphan_media=args.orphan_media, seed=args.seed)
+        print(f"已生成 {xlsx_path} ({os.path.getsize(xlsx_path) / 1048576:.1f} MB, "
+              f"{time.perf_counter() - start:.1f}s)", file=sys.stderr)
+
+    best = {}
+    for n in range(args.repeat):
+        work_dir = os.path.join(work_root, f'run{n}')
+        os.makedirs(work_dir)
+        for stage, metrics in run_benchmark(xlsx_path, work_dir, args.trace_memory, args.inflate_workers).items():
+            if stage not in best or metrics['wall_seconds'] < best[stage]['wall_seconds']:
+                best[stage] = metrics
+
+    results['stages'] = best
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if not args.keep:
+        shutil.rmtree(work_root, ignore_errors=True)
+    else:
+        print(f"输出保留在 {work_root}", file=sys.stderr)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for stage, before, after in regressions:
+            print(f"退化: {stage} {before:.3f}s -> {after:.3f}s", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+增量提取清单
+
+在输出目录中保存 .extract_manifest.json，记录上次提取时压缩包中央目录里
+每个成员的CRC32和大小，以及解析出的 (ID, image) 映射。再次提取同一工作簿时：
+
+- cellimages.xml 及其关系部件的CRC和大小都未变化时，直接使用缓存的映射，不再解析；
+- 图像成员的CRC和大小未变化、且上次写出的文件仍存在时，跳过解压和写入。
+"""
+import json
+import os
+
+from .engine import CELLIMAGES_PART, CELLIMAGES_RELS_PART, MEDIA_PREFIX
+
+MANIFEST_NAME = '.extract_manifest.json'
+MANIFEST_VERSION = 1
+
+
+def _fingerprint(info):
+    return [info.CRC, info.file_size] if info is not None else None
+
+
+class Manifest:
+    """单个输出目录的增量提取清单"""
+
+    def __init__(self, path, data=None):
+        self.path = path
+        data = data or {}
+        self.parts = data.get('parts', {})
+        self.images = data.get('images')
+        self.members = data.get('members', {})
+
+    @classmethod
+    def load(cls, output_dir):
+        """读取输出目录中的清单；不存在、损坏或版本不符时返回空清单"""
+        path = os.path.join(output_dir, MANIFEST_NAME)
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls(path)
+        if not isinstance(data, dict) or data.get('version') != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, data)
+
+    def cached_images(self, infos):
+        """
+        cellimages.xml 及其关系部件未变化时返回缓存的 [(ID, image), ...]，否则返回None
+
+        infos 为 {成员路径: ZipInfo}。
+        """
+        if self.images is None:
+            return None
+        for part in (CELLIMAGES_PART, CELLIMAGES_RELS_PART):
+            if self.parts.get(part) != _fingerprint(infos.get(part)):
+                return None
+        return [tuple(record) for record in self.images]
+
+    def unchanged_path(self, name, info, base_dir):
+        """
+        成员未变化、且上次写出的文件仍在 base_dir 中时返回该文件路径，否则返回None
+
+        name 为 xl/media 下的文件名，base_dir 为本次写出的目录（media目录或去重存储目录）。
+        """
+        entry = self.members.get(name)
+        if entry is None or [entry.get('crc'), entry.get('size')] != _fingerprint(info):
+            return None
+        path = entry.get('path')
+        if not path or not path.startswith(os.path.join(base_dir, '')):
+            return None
+        try:
+            if os.path.getsize(path) == info.file_size:
+                return path
+        except OSError:
+            pass
+        return None
+
+    def update(self, infos, images, members):
+        """
+        记录本次提取的结果
+
+        images 为完整（未按名称过滤）的映射，members 为 {文件名: 写出的文件路径}。
+        """
+        self.parts = {part: _fingerprint(infos.get(part)) for part in (CELLIMAGES_PART, CELLIMAGES_RELS_PART)}
+        self.images = [list(record) for record in images]
+        for name, path in members.items():
+            info = infos.get(MEDIA_PREFIX + name)
+            if info is not None:
+                self.members[name] = {'crc': info.CRC, 'size': info.file_size, 'path': path}
+
+    def save(self):
+        """原子地写入清单文件"""
+        data = {
+            'version': MANIFEST_VERSION,
+            'parts': self.parts,
+            'images': self.images,
+            'members': self.members,
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,44 @@
+"""
+命令行工具共用的退出码和输出格式
+
+python -m xlsx_cellimages（批处理）和 python -m xlsx_cellimages.watch（监视目录）共用。
+"""
+import glob
+import os
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+
+def expand_inputs(patterns):
+    """展开输入中的通配符，去重并保持顺序"""
+    seen = set()
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            key = os.path.abspath(path)
+            if key not in seen and os.path.isfile(path):
+                seen.add(key)
+                paths.append(path)
+    return paths
+
+
+def format_stats(result):
+    """生成单个工作簿的吞吐量和峰值内存摘要"""
+    parts = []
+    if result.media_stats is not None:
+        stats = result.media_stats
+        parts.append(f"{stats.bytes_written / 1048576:.1f} MB, {stats.bytes_per_sec / 1048576:.1f} MB/s")
+        if stats.skipped:
+            parts.append(f"跳过未变化 {stats.skipped} 个")
+        if stats.duplicates:
+            parts.append(f"{stats.duplicates} 个重复, 节省 {stats.bytes_saved / 1048576:.1f} MB")
+    if result.cells is not None:
+        parts.append(f"定位 {len(result.cells)} 个单元格")
+    if result.excel_rows_per_sec is not None:
+        parts.append(f"Excel {result.excel_rows_per_sec:.0f} 行/秒")
+    if result.peak_rss is not None:
+        parts.append(f"峰值内存 {result.peak_rss / 1048576:.1f} MB")
+    return f" ({'; '.join(parts)})" if parts else ""
@@ -0,0 +1,141 @@
+"""
+按内容寻址的图像去重存储
+
+相同内容（SHA-256）只写一次，存放在 <store>/<前两位摘要>/<摘要><扩展名>。
+存储中另有按压缩包目录中的CRC-32和大小建立的索引（<store>/crc32/<CRC>-<大小>/
+下的空文件，文件名为 <摘要><扩展名>）：索引中已有相同CRC和大小的成员只解压
+计算摘要，确认重复后不再写入存储；新内容在流式写出的同时计算摘要。可选为每个成员在media目录中创建指向
+该文件的硬链接，这样报告中的路径保持不变。多个工作簿（包括批处理中的多个
+进程）可以共用同一个存储目录。
+"""
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+
+DEDUP_MODES = ('cas', 'hardlink')
+
+
+class BlobStore:
+    """
+    内容寻址的图像存储
+
+    Parameters:
+        root  – 存储目录
+        link  – 为True时在目标路径创建指向存储文件的硬链接（不支持硬链接时复制）
+    """
+
+    def __init__(self, root, link=False):
+        self.root = os.path.abspath(root)
+        self.link = link
+        self.paths = {}
+        self.unique = 0
+        self.duplicates = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._link_failed = False
+        os.makedirs(self.root, exist_ok=True)
+
+    def blob_path(self, digest, ext):
+        return os.path.join(self.root, digest[:2], digest + ext)
+
+    def _index_dir(self, crc, size):
+        return os.path.join(self.root, 'crc32', f"{crc:08x}-{size}")
+
+    def _known(self, crc, size, ext):
+        """索引中CRC、大小和扩展名都相同的存储文件名集合"""
+        try:
+            names = os.listdir(self._index_dir(crc, size))
+        except FileNotFoundError:
+            return set()
+        return {n for n in names if n.endswith(ext) and not n.startswith('.')}
+
+    def _remember(self, crc, size, blob_name):
+        index_dir = self._index_dir(crc, size)
+        os.makedirs(index_dir, exist_ok=True)
+        try:
+            open(os.path.join(index_dir, blob_name), 'x').close()
+        except FileExistsError:
+            pass
+
+    def add(self, name, info, open_member, target_path, buf):
+        """
+        写入一个成员，返回实际写入存储的字节数（重复内容不写入，为0）
+
+        name 为成员在报告中的文件名（如 image1.png），对应的存储文件路径记录在
+        self.paths[name] 中。info 为成员的 ZipInfo（提供CRC和大小），
+        open_member() 返回成员内容的二进制流；索引中有相同CRC和大小的内容时
+        先只读计算摘要，确认不是重复才再次读取并写入。
+        """
+        ext = os.path.splitext(name)[1].lower()
+        view = memoryview(buf)
+        path = None
+        known = self._known(info.CRC, info.file_size, ext)
+        if known:
+            hasher = hashlib.sha256()
+            with open_member() as source:
+                while n := source.readinto(view):
+                    hasher.update(view[:n])
+            digest = hasher.hexdigest()
+            if digest + ext in known and os.path.exists(self.blob_path(digest, ext)):
+                path = self.blob_path(digest, ext)
+
+        written = 0
+        stored = False
+        if path is None:
+            path, written, stored = self._write(open_member, ext, view)
+            self._remember(info.CRC, info.file_size, os.path.basename(path))
+
+        with self._lock:
+            self.paths[name] = path
+            if stored:
+                self.unique += 1
+            else:
+                self.duplicates += 1
+                if not written:
+                    self.bytes_saved += info.file_size
+
+        if self.link:
+            self._place(path, target_path)
+        return written
+
+    def _write(self, open_member, ext, view):
+        """
+        流式写入临时文件并计算摘要，返回 (存储文件路径, 写入的字节数, 是否为新内容)
+
+        其他线程或进程已写入相同内容时丢弃临时文件，写入的字节数仍计入返回值。
+        """
+        hasher = hashlib.sha256()
+        tmp_path = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        size = 0
+        try:
+            with open_member() as source, open(tmp_path, 'wb') as tmp:
+                while n := source.readinto(view):
+                    chunk = view[:n]
+                    hasher.update(chunk)
+                    tmp.write(chunk)
+                    size += n
+            path = self.blob_path(hasher.hexdigest(), ext)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            stored = not os.path.exists(path)
+            if stored:
+                # 其他线程或进程可能同时写入相同内容，os.replace 保证文件总是完整的
+                os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path, size, stored
+
+    def _place(self, path, target_path):
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        if os.path.lexists(target_path):
+            os.remove(target_path)
+        if not self._link_failed:
+            try:
+                os.link(path, target_path)
+                return
+            except OSError:
+                # 例如FAT文件系统或跨设备，之后直接复制
+                self._link_failed = True
+        shutil.copyfile(path, target_path)
@@ -0,0 +1,728 @@
+"""
+无界面的提取引擎
+
+不依赖tkinter，可在无图形环境的服务器上直接调用。进度和日志通过 report
+回调输出，回调签名与GUI的 queue_message 相同: report(msg_type, *args)，
+msg_type 取 "log"、"status"、"progress"。
+
+工作簿输入可以是文件路径、bytes/bytearray/memoryview 或可定位的二进制文件
+对象（见 WorkbookSource）。
+"""
+import io
+import mmap
+import os
+import posixpath
+import struct
+import sys
+import threading
+import time
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+
+# 定义XML命名空间
+NAMESPACES = {
+    'xdr': 'http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing',
+    'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+    'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+    'etc': 'http://www.wps.cn/officeDocument/2017/etCustomData'
+}
+
+CELLIMAGES_PART = 'xl/cellimages.xml'
+CELLIMAGES_RELS_PART = 'xl/_rels/cellimages.xml.rels'
+MEDIA_DIR = 'xl/media'
+MEDIA_PREFIX = MEDIA_DIR + '/'
+
+PACKAGE_RELS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+# 流式复制时每个线程复用的缓冲区大小
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def _noop(msg_type, *args):
+    pass
+
+
+def peak_rss_bytes():
+    """返回当前进程的峰值常驻内存（字节），平台不支持时返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+@dataclass
+class MediaStats:
+    """图像文件提取的统计信息"""
+    files: int = 0
+    bytes_written: int = 0
+    seconds: float = 0.0
+    skipped: int = 0
+    duplicates: int = 0
+    bytes_saved: int = 0
+
+    @property
+    def bytes_per_sec(self):
+        return self.bytes_written / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass
+class ExtractionResult:
+    """单个工作簿的提取结果"""
+    xlsx_path: str
+    output_dir: str
+    images: list = field(default_factory=list)
+    csv_path: str | None = None
+    excel_path: str | None = None
+    media_dir: str | None = None
+    media_stats: MediaStats | None = None
+    image_paths: dict | None = None
+    excel_rows_per_sec: float | None = None
+    peak_rss: int | None = None
+    metrics: dict | None = None
+    cells: list | None = None
+    thumbnail_paths: dict | None = None
+    cells_csv_path: str | None = None
+    ok: bool = True
+
+
+def read_relationships(z, names, rels_part=CELLIMAGES_RELS_PART):
+    """
+    解析关系部件，返回 {rId: 压缩包内成员路径}
+
+    Target 为相对 xl/ 的路径（如 media/image1.png）或以 / 开头的绝对路径，
+    统一转换为 xl/media/image1.png 的形式；不存在的目标会被忽略。
+    """
+    if rels_part not in names:
+        return {}
+    base = posixpath.dirname(posixpath.dirname(rels_part))
+    with z.open(rels_part) as f:
+        root = ET.parse(f).getroot()
+    member_set = set(names)
+    rels = {}
+    for rel in root.iter(f'{{{PACKAGE_RELS_NS}}}Relationship'):
+        rid = rel.get('Id')
+        target = rel.get('Target')
+        if not rid or not target or rel.get('TargetMode') == 'External':
+            continue
+        if target.startswith('/'):
+            member = target.lstrip('/')
+        else:
+            member = posixpath.normpath(posixpath.join(base, target))
+        if member in member_set:
+            rels[rid] = member
+    return rels
+
+
+def media_stem_index(names):
+    """建立 xl/media 下 {去掉扩展名的路径: 成员路径} 索引，用于rels缺失时按编号查找"""
+    index = {}
+    for fn in names:
+        if fn.startswith(MEDIA_PREFIX):
+            index.setdefault(fn.rsplit('.', 1)[0], fn)
+    return index
+
+
+def resolve_embed(embed, rels, stem_index):
+    """
+    将 r:embed 的rId解析为 xl/media 下的图像文件名，找不到时返回None
+
+    优先使用关系部件中的映射；没有时回退为按rId编号匹配 xl/media/image{编号}.*
+    """
+    member = rels.get(embed)
+    if member is None:
+        member = stem_index.get(f"{MEDIA_PREFIX}image{embed.removeprefix('rId')}")
+    if member is None:
+        return None
+    return member.removeprefix(MEDIA_PREFIX)
+
+
+_CELL_IMAGE_TAG = f"{{{NAMESPACES['etc']}}}cellImage"
+_C_NV_PR_TAG = f"{{{NAMESPACES['xdr']}}}cNvPr"
+_BLIP_TAG = f"{{{NAMESPACES['a']}}}blip"
+_EMBED_ATTR = f"{{{NAMESPACES['r']}}}embed"
+
+
+def iter_cellimages(source):
+    """
+    增量解析cellimages.xml，每个etc:cellImage元素结束时产出 (name, embed)
+
+    source 为文件路径或二进制文件对象。name 取第一个xdr:cNvPr元素的name属性，
+    embed 取第一个a:blip元素的r:embed属性（如 "rId1"），缺失时为None。
+    已处理的元素会被清除，内存占用不随文件大小增长。
+    """
+    depth = 0
+    root = None
+    name = embed = None
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            # 根元素下的直接子元素处理完毕，只有etc:cellImage产出结果
+            if elem.tag == _CELL_IMAGE_TAG:
+                yield name, embed
+            name = embed = None
+            root.clear()
+        elif elem.tag == _C_NV_PR_TAG:
+            if name is None:
+                name = elem.get('name')
+        elif elem.tag == _BLIP_TAG:
+            if embed is None:
+                embed = elem.get(_EMBED_ATTR)
+
+
+class _BufferReader(io.RawIOBase):
+    """内存缓冲区上只读、可定位的文件对象，供 zipfile 读取，不复制整个缓冲区"""
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self._pos = offset
+        return offset
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        data = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+class WorkbookSource:
+    """
+    工作簿输入：文件路径、bytes/bytearray/memoryview，或可定位的二进制文件对象
+
+    路径另外以只读方式映射到内存（mmap；空文件或不支持映射时不映射），内存
+    缓冲区直接读取、不复制。buffer 为整个工作簿的 memoryview（文件对象输入
+    时为None），以存储方式保存的成员可从中直接取得内容（见 read_member）。
+    open() 每次返回新的 ZipFile：路径仍按普通文件打开（zipfile 的缓冲读取
+    比Python层的内存读取快，多线程解压时尤其明显），路径和缓冲区输入的各个
+    ZipFile 互不影响，可以在多个线程中同时使用（concurrent 为True）；文件对象
+    输入只有一个读取位置，不能同时打开多个。
+
+    关闭时解除映射；调用者仍持有从 buffer 切出的 memoryview 时，映射在最后一个
+    视图释放后才解除，这些视图始终有效。
+    """
+
+    # 写出以存储方式保存的成员后用于释放映射页面的madvise选项，平台不支持时为None
+    _DISCARD = getattr(mmap, 'MADV_DONTNEED', None)
+
+    def __init__(self, source):
+        self.name = None
+        self.buffer = None
+        self._fileobj = None
+        self._file = self._mmap = None
+        if isinstance(source, (str, os.PathLike)):
+            self.name = os.fspath(source)
+            self._file = open(self.name, 'rb')
+            try:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                self._mmap = None
+            else:
+                self.buffer = memoryview(self._mmap)
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            self.buffer = memoryview(source).cast('B')
+        else:
+            self._fileobj = source
+            self.name = getattr(source, 'name', None)
+
+    @property
+    def concurrent(self):
+        return self._fileobj is None
+
+    def open(self):
+        """返回工作簿上新的只读 ZipFile"""
+        if self._file is not None:
+            return zipfile.ZipFile(self.name, 'r')
+        if self._fileobj is not None:
+            return zipfile.ZipFile(self._fileobj, 'r')
+        return zipfile.ZipFile(_BufferReader(self.buffer), 'r')
+
+    def copy_stored(self, info, target):
+        """
+        把以存储方式保存的成员从映射中写入 target，返回写入的字节数；成员不能直接
+        取得时返回None
+
+        按 COPY_BUFFER_SIZE 分段写出并校验CRC，写过的页面随即交还系统（支持
+        madvise 的平台），常驻内存不随成员大小增长。
+        """
+        span = _stored_span(info, self.buffer)
+        if span is None:
+            return None
+        start, end = span
+        discard = self._DISCARD is not None and self._mmap is not None
+        crc = 0
+        released = start - start % mmap.PAGESIZE
+        for offset in range(start, end, COPY_BUFFER_SIZE):
+            chunk = self.buffer[offset:min(offset + COPY_BUFFER_SIZE, end)]
+            crc = zlib.crc32(chunk, crc)
+            target.write(chunk)
+            if discard:
+                boundary = (offset + len(chunk)) // mmap.PAGESIZE * mmap.PAGESIZE
+                if boundary > released:
+                    self._mmap.madvise(self._DISCARD, released, boundary - released)
+                    released = boundary
+        if crc != info.CRC:
+            raise zipfile.BadZipFile(f"Bad CRC-32 for file {info.filename!r}")
+        return end - start
+
+    def close(self):
+        self.buffer = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # 调用者仍持有视图，映射随最后一个视图释放
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+_LOCAL_HEADER = struct.Struct('<4s22xHH')
+
+
+def _stored_span(info, buffer):
+    """以存储方式保存的成员内容在 buffer 中的 (起点, 终点)，不能直接取得时返回None"""
+    if buffer is None or info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+        return None
+    offset = info.header_offset
+    signature, name_length, extra_length = _LOCAL_HEADER.unpack_from(buffer, offset)
+    if signature != b'PK\x03\x04':
+        raise zipfile.BadZipFile(f"Bad magic number for file header: {info.filename}")
+    start = offset + _LOCAL_HEADER.size + name_length + extra_length
+    if start + info.file_size > len(buffer):
+        raise zipfile.BadZipFile(f"Truncated file header: {info.filename}")
+    return start, start + info.file_size
+
+
+def _stored_view(info, buffer):
+    """以存储方式保存的成员在 buffer 中的 memoryview，不能直接取得时返回None"""
+    span = _stored_span(info, buffer)
+    if span is None:
+        return None
+    payload = buffer[span[0]:span[1]]
+    if zlib.crc32(payload) != info.CRC:
+        raise zipfile.BadZipFile(f"Bad CRC-32 for file {info.filename!r}")
+    return payload
+
+
+def read_member(zf, info, buffer=None):
+    """
+    读取一个压缩包成员的内容
+
+    buffer 为压缩包本身的 memoryview（WorkbookSource.buffer）时，以存储方式
+    （未压缩）保存的成员直接返回指向 buffer 的 memoryview，不复制数据（同样
+    校验CRC）；其他成员解压后返回 bytes。
+    """
+    payload = _stored_view(info, buffer)
+    return zf.read(info) if payload is None else payload
+
+
+def iter_cellimages_from_xlsx(xlsx_path, report=None):
+    """
+    逐个产出工作簿中单元格图像的 (ID, image)，边解析边输出
+
+    xlsx_path 为路径、bytes/memoryview 或可定位的二进制文件对象。
+    r:embed 通过 xl/_rels/cellimages.xml.rels 解析为图像文件，无法解析的条目被跳过。
+    工作簿中不含 xl/cellimages.xml 时不产出任何内容；文件损坏时抛出异常。
+    """
+    with WorkbookSource(xlsx_path) as source, source.open() as z:
+        yield from _iter_cellimages_in(z)
+
+
+def _iter_cellimages_in(z, names=None):
+    """在已打开的ZipFile上逐个产出 (ID, image)；names 为图像名称集合，指定时只产出其中的图像"""
+    members = z.namelist()
+    if CELLIMAGES_PART not in members:
+        return
+    rels = read_relationships(z, members)
+    stem_index = media_stem_index(members)
+    with z.open(CELLIMAGES_PART) as f:
+        for name, embed in iter_cellimages(f):
+            if name is None or embed is None or (names is not None and name not in names):
+                continue
+            # get image name from rId
+            image_name = resolve_embed(embed, rels, stem_index)
+            if image_name is not None:
+                yield name, image_name
+
+
+def extract_cellimages_from_xlsx(xlsx_path, report=None):
+    """
+    从XML文件中提取xdr:cNvpr元素的name属性和a:blip元素的r:embed属性
+    返回元组列表 [(ID1, image1), (ID2, image2), ...]
+
+    xlsx_path 为路径、bytes/memoryview 或可定位的二进制文件对象。
+    r:embed 通过 xl/_rels/cellimages.xml.rels 解析为图像文件。
+    工作簿中不含 xl/cellimages.xml 时返回空列表；文件损坏时抛出异常。
+    """
+    return list(iter_cellimages_from_xlsx(xlsx_path, report))
+
+
+def iter_subdir_from_zip(zip_path, subdir, only=None, report=None):
+    """
+    Yield (name, payload) for the files inside 'subdir/' without writing to disk.
+
+    Parameters:
+        zip_path  – path, bytes/bytearray/memoryview or seekable binary file object
+        subdir    – folder name inside the zip (e.g. "xl/media")
+        only      – optional collection of member names relative to subdir
+        report    – optional progress callback, report(msg_type, *args)
+
+    name is relative to subdir (e.g. "image1.png"). payload is a memoryview
+    into the zip for stored members of path and buffer inputs (zero-copy,
+    valid after iteration ends) and bytes for deflated members.
+    """
+    with WorkbookSource(zip_path) as source, source.open() as zf:
+        yield from _iter_subdir_in(zf, source.buffer, subdir, only, report or _noop)
+
+
+def _iter_subdir_in(zf, buffer, subdir, only, report):
+    if not subdir.endswith('/'):
+        subdir += '/'
+    infos = [i for i in zf.infolist() if i.filename.startswith(subdir) and not i.filename.endswith('/')]
+    if only is not None:
+        only = set(only)
+        infos = [i for i in infos if i.filename[len(subdir):] in only]
+    for count, info in enumerate(infos, 1):
+        yield info.filename[len(subdir):], read_member(zf, info, buffer)
+        report("progress", count / len(infos) * 100)
+
+
+def read_cellimage_payloads(xlsx_path, report=None):
+    """
+    读取工作簿中被单元格引用的图像，不写入磁盘
+
+    返回 (records, payloads)：records 与 extract_cellimages_from_xlsx 相同，
+    payloads 为 {图像文件名: 内容}，内容为 memoryview 或 bytes（见 iter_subdir_from_zip）。
+    """
+    report = report or _noop
+    with WorkbookSource(xlsx_path) as source, source.open() as z:
+        records = list(_iter_cellimages_in(z))
+        payloads = dict(_iter_subdir_in(z, source.buffer, MEDIA_DIR, {image for _, image in records}, report))
+    report("log", f"读取了 {len(payloads)} 个图像文件, {sum(len(p) for p in payloads.values()) / 1048576:.1f} MB")
+    return records, payloads
+
+
+def _copy_stream(source, target, buf):
+    """使用固定大小的缓冲区复制数据，返回复制的字节数"""
+    view = memoryview(buf)
+    total = 0
+    while True:
+        n = source.readinto(view)
+        if not n:
+            return total
+        target.write(view[:n])
+        total += n
+
+
+def _extract_members(zf, members, subdir, dest_dir, on_done, store=None, source=None):
+    """
+    在已打开的ZipFile上顺序提取一组成员，返回写入的字节数
+
+    store 为去重存储（BlobStore）时，成员内容交给存储写入，相同内容只写一次。
+    source 为 zf 所属的 WorkbookSource 时，以存储方式保存的成员直接从内存
+    映射中分段写出（见 WorkbookSource.copy_stored）。
+    """
+    buf = bytearray(COPY_BUFFER_SIZE)
+    written = 0
+    for member in members:
+        # Remove the leading subdir part so we don't create extra nesting
+        target_path = os.path.join(dest_dir, member[len(subdir):])
+
+        # If it's a directory entry (ends with '/'), create the dir
+        if member.endswith('/'):
+            os.makedirs(target_path, exist_ok=True)
+        else:
+            if store is not None:
+                info = zf.getinfo(member)
+                written += store.add(member[len(subdir):], info, lambda: zf.open(info), target_path, buf)
+            else:
+                # Ensure parent directory exists
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                with open(target_path, "wb") as target:
+                    copied = source.copy_stored(zf.getinfo(member), target) if source is not None else None
+                    if copied is None:
+                        # Stream the file through the reusable buffer
+                        with zf.open(member) as data:
+                            copied = _copy_stream(data, target, buf)
+                    written += copied
+        on_done(member)
+    return written
+
+
+def _extract_members_from(source, members, subdir, dest_dir, on_done, store=None):
+    """在独立的ZipFile句柄上提取一组成员，source 为 WorkbookSource"""
+    with source.open() as zf:
+        return _extract_members(zf, members, subdir, dest_dir, on_done, store, source)
+
+
+def extract_subdir_from_zip(zip_path, subdir, dest_dir, report=None, workers=1, only=None, store=None):
+    """
+    Extract only the files inside 'subdir/' (or deeper) from the zip.
+
+    Members are streamed through a fixed-size buffer, so peak memory does
+    not depend on member size. With workers > 1 members are inflated
+    concurrently, each thread using its own ZipFile handle (zlib releases
+    the GIL while inflating); file object inputs are read by one thread.
+
+    Parameters:
+        zip_path  – path to the .zip file (memory-mapped), bytes/bytearray/
+                    memoryview, or a seekable binary file object
+        subdir    – folder name inside the zip (e.g. "myfolder" or "path/to/myfolder")
+        dest_dir  – where to extract on disk
+        report    – optional progress callback, report(msg_type, *args)
+        workers   – number of inflate threads
+        only      – optional collection of member names relative to subdir
+                    (e.g. "image1.png"); other members are skipped
+        store     – optional BlobStore; identical members are written once
+
+    Returns a MediaStats instance.
+    """
+    report = report or _noop
+    # Make sure subdir ends with '/' so we match is exact
+    if not subdir.endswith('/'):
+        subdir += '/'
+
+    os.makedirs(dest_dir, exist_ok=True)
+
+    with WorkbookSource(zip_path) as source:
+        return _extract_subdir(source, subdir, dest_dir, report, workers, only, store)
+
+
+def _extract_subdir(source, subdir, dest_dir, report, workers, only, store):
+    with source.open() as zf:
+        infos = [i for i in zf.infolist() if i.filename.startswith(subdir)]
+    if only is not None:
+        only = set(only)
+        infos = [i for i in infos if i.filename[len(subdir):] in only]
+    total_files = len(infos)
+    stats = MediaStats(files=total_files)
+    start = time.perf_counter()
+
+    lock = threading.Lock()
+    done = 0
+
+    def on_done(member):
+        nonlocal done
+        with lock:
+            done += 1
+            progress = done / total_files * 100
+        # 更新进度
+        report("progress", progress)
+        report("log", f"提取文件: {member[len(subdir):]}")
+
+    workers = max(1, min(workers, total_files)) if source.concurrent else 1
+    if workers == 1:
+        stats.bytes_written = _extract_members_from(source, [i.filename for i in infos], subdir, dest_dir,
+                                                    on_done, store)
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+
+        # 按解压后大小轮流分配，使各线程负载接近
+        infos.sort(key=lambda i: i.file_size, reverse=True)
+        groups = [[i.filename for i in infos[n::workers]] for n in range(workers)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_extract_members_from, source, group, subdir, dest_dir, on_done, store)
+                       for group in groups]
+            stats.bytes_written = sum(f.result() for f in futures)
+
+    stats.seconds = time.perf_counter() - start
+    if store is not None:
+        stats.duplicates = store.duplicates
+        stats.bytes_saved = store.bytes_saved
+    return stats
+
+
+def create_csv(tuples_list, output_dir, report=None, paths=None, derived=None):
+    """
+    创建CSV文件来存储提取的图像信息
+
+    paths 为 {图像文件名: 文件路径}，提供时（如去重存储）使用其中的路径。
+    derived 为 {图像文件名: 缩略图路径}，提供时增加 thumb_path 列。
+    """
+    report = report or _noop
+    try:
+        csv_path = os.path.abspath(os.path.join(output_dir, 'extracted_images.csv'))
+
+        with open(csv_path, 'w') as csv:
+            # 写入CSV表头
+            csv.write('ID,img_path,thumb_path\n' if derived is not None else 'ID,img_path\n')
+
+            # 遍历所有图像信息并写入CSV
+            for ID, image in tuples_list:
+                # 构建图像文件的完整路径
+                if paths is not None and image in paths:
+                    img_path = paths[image]
+                else:
+                    img_path = os.path.abspath(os.path.join(output_dir, "media", image))
+
+                # 处理Windows路径分隔符（将单个反斜杠替换为双反斜杠）
+                if os.path.sep == "\\":
+                    img_path = f"{str(img_path).replace(os.sep, '\\\\')}"
+
+                # 写入CSV行（使用双引号包裹字段值）
+                if derived is not None:
+                    thumb_path = derived.get(image, '')
+                    if os.path.sep == "\\":
+                        thumb_path = thumb_path.replace(os.sep, '\\\\')
+                    csv.write(f'"{ID}","{img_path}","{thumb_path}"\n')
+                else:
+                    csv.write(f'"{ID}","{img_path}"\n')
+
+        report("log", f"CSV文件已保存到 {csv_path}")
+        return True
+
+    except Exception as e:
+        report("log", f"创建CSV文件时出错: {e}")
+        return False
+
+
+EXCEL_HEADERS = ["序号", "图像名称", "图像文件", "完整路径", "提取时间"]
+EXCEL_THUMBNAIL_HEADER = "缩略图路径"
+EXCEL_MAX_COLUMN_WIDTH = 50
+
+
+def _excel_rows(tuples_list, media_dir, extracted, extract_time, paths, derived=None):
+    """生成Excel报告的数据行"""
+    for idx, (image_name, image_file) in enumerate(tuples_list, 1):
+        if paths is not None and image_file in paths:
+            # 调用者给出的路径原样使用（如归档内的相对路径）
+            full_path = paths[image_file]
+        else:
+            img_path = os.path.join(media_dir, image_file) if media_dir else image_file
+            exists = image_file in extracted if extracted is not None else os.path.exists(img_path)
+            full_path = os.path.abspath(img_path) if exists else f"未找到: {img_path}"
+        # 序号, 图像名称, 图像文件, 完整路径, 提取时间[, 缩略图路径]
+        row = (idx, image_name, image_file, full_path.replace("\\", "\\\\"), extract_time)
+        if derived is not None:
+            row += (derived.get(image_file, '').replace("\\", "\\\\"),)
+        yield row
+
+
+def create_excel_worksheet(tuples_list, output_dir, media_dir, report=None, extracted=None, paths=None,
+                           derived=None):
+    """
+    创建Excel工作表来存储提取的图像信息
+
+    使用openpyxl的write_only模式逐行写出，所有单元格共用同一组样式，不为每个
+    单元格创建样式对象。tuples_list 可以是列表或生成器，只遍历一次。extracted 为已提取到media_dir的图像文件名集合；提供时据此
+    判断文件是否存在，不再逐个检查磁盘。paths 为 {图像文件名: 文件路径}，
+    提供时（如去重存储或归档内的相对路径）原样使用其中的路径。derived 为
+    {图像文件名: 缩略图路径}，提供时增加“缩略图路径”列。
+    """
+    report = report or _noop
+    try:
+        # openpyxl较重，仅在需要时导入
+        import openpyxl
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, Alignment, Border, Side
+        from openpyxl.utils import get_column_letter
+        from datetime import datetime
+
+        excel_path = os.path.abspath(os.path.join(output_dir, 'extracted_images.xlsx'))
+        start = time.perf_counter()
+
+        # 创建工作簿和工作表
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("提取的图像")
+
+        extract_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        # 调整列宽：write_only模式下列宽必须在写入第一行之前设置，
+        # 因此先生成全部数据行（tuples_list 可以是生成器，只遍历一次），
+        # 只计算各列字符串长度，不创建单元格对象
+        headers = EXCEL_HEADERS + [EXCEL_THUMBNAIL_HEADER] if derived is not None else EXCEL_HEADERS
+        data_rows = list(_excel_rows(tuples_list, media_dir, extracted, extract_time, paths, derived))
+        widths = [len(header) for header in headers]
+        for row in data_rows:
+            for col_idx, value in enumerate(row):
+                length = len(str(value))
+                if length > widths[col_idx]:
+                    widths[col_idx] = length
+        for col_idx, width in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(col_idx)].width = min(width + 2, EXCEL_MAX_COLUMN_WIDTH)
+
+        # 添加边框
+        thin_border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
+
+        # 样式模板：每个单元格复用模板的样式索引，不重复创建样式对象
+        header_template = WriteOnlyCell(ws)
+        header_template.font = Font(bold=True)
+        header_template.alignment = Alignment(horizontal="center", vertical="center")
+        header_template.border = thin_border
+        body_template = WriteOnlyCell(ws)
+        body_template.border = thin_border
+
+        def styled(value, template):
+            cell = WriteOnlyCell(ws, value)
+            cell._style = template._style
+            return cell
+
+        # 设置标题行
+        ws.append([styled(header, header_template) for header in headers])
+
+        # 添加数据行
+        for row in data_rows:
+            ws.append([styled(value, body_template) for value in row])
+        rows = len(data_rows)
+
+        # 保存工作簿
+        wb.save(excel_path)
+        elapsed = time.perf_counter() - start
+        rate = rows / elapsed if elapsed > 0 else 0.0
+        report("log", f"Excel工作表保存到 {excel_path}")
+        report("log", f"Excel工作表共 {rows} 行, {rate:.0f} 行/秒")
+        return True
+
+    except ImportError:
+        report("log", "警告: openpyxl库未安装，无法创建Excel文件")
+        report("log", "请使用以下命令安装: pip install openpyxl")
+        return False
+    except Exception as e:
+        report("log", f"创建Excel文件时出错: {e}")
+        return False
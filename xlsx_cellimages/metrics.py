@@ -0,0 +1,239 @@
+"""
+分阶段的计时与指标
+
+每个阶段记录墙钟时间、CPU时间、条目数、读写字节数和结束时的峰值内存。
+同一阶段可以在多个线程中执行（如并行解压），此时墙钟时间为最早开始到最晚
+结束的跨度，CPU时间为各线程之和。
+
+可通过 subscribe 注册回调接收 ("start"/"end", 阶段名, 指标) 事件（GUI即是
+其中一个使用者），也可以把汇总结果写成JSON或Prometheus textfile格式。
+profile=True 时为阶段启用cProfile，结果合并后写出。Python 3.12起cProfile
+基于 sys.monitoring，同一时刻只能有一个profiler且会覆盖所有线程，此时第一个
+启用的profiler一直保持到所有阶段结束。
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+from .engine import peak_rss_bytes
+
+
+class _StageMetrics:
+    __slots__ = ('start', 'end', 'cpu_seconds', 'items', 'bytes_read', 'bytes_written', 'peak_rss', 'active')
+
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self.cpu_seconds = 0.0
+        self.items = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.peak_rss = None
+        self.active = 0
+
+    def as_dict(self):
+        wall = (self.end - self.start) if self.start is not None and self.end is not None else 0.0
+        return {
+            'wall_seconds': round(wall, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'items': self.items,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'peak_rss': self.peak_rss,
+        }
+
+
+class _StageContext:
+    """Metrics.stage() 返回的上下文，在当前线程中计时"""
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.cpu = time.thread_time()
+        self.profiler = self.metrics._start_profiler()
+        self.metrics._begin(self.name)
+        return self
+
+    def add(self, items=0, bytes_read=0, bytes_written=0):
+        self.metrics.add(self.name, items, bytes_read, bytes_written)
+
+    def __exit__(self, *exc):
+        self.metrics._stop_profiler(self.profiler)
+        self.metrics._finish(self.name, time.thread_time() - self.cpu)
+        return False
+
+
+class Metrics:
+    """一次提取运行的分阶段指标"""
+
+    def __init__(self, profile=False):
+        self.profile = profile
+        self._stages = {}
+        self._subscribers = []
+        self._profilers = []
+        self._profiling_stages = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._created = time.perf_counter()
+
+    def subscribe(self, callback):
+        """注册回调 callback(event, stage, metrics)，event 为 start 或 end"""
+        self._subscribers.append(callback)
+        return callback
+
+    def stage(self, name):
+        """计时上下文: with metrics.stage("parse") as s: ...; s.add(items=1)"""
+        return _StageContext(self, name)
+
+    def add(self, name, items=0, bytes_read=0, bytes_written=0):
+        """累加阶段的条目数和读写字节数"""
+        with self._lock:
+            stage = self._stages.setdefault(name, _StageMetrics())
+            stage.items += items
+            stage.bytes_read += bytes_read
+            stage.bytes_written += bytes_written
+
+    def summary(self):
+        """返回 {阶段名: 指标字典}，可序列化、可跨进程传递"""
+        with self._lock:
+            stages = {name: stage.as_dict() for name, stage in self._stages.items()}
+        return {
+            'wall_seconds': round(time.perf_counter() - self._created, 6),
+            'peak_rss': peak_rss_bytes(),
+            'stages': stages,
+        }
+
+    def dump_profile(self, path):
+        """把各阶段线程的cProfile结果合并写入 path（pstats格式），没有结果时返回False"""
+        if not self._profilers:
+            return False
+        import pstats
+        stats = pstats.Stats(self._profilers[0])
+        for profiler in self._profilers[1:]:
+            stats.add(profiler)
+        stats.dump_stats(path)
+        return True
+
+    def _begin(self, name):
+        now = time.perf_counter()
+        with self._lock:
+            stage = self._stages.setdefault(name, _StageMetrics())
+            if stage.start is None:
+                stage.start = now
+            stage.active += 1
+            first = stage.active == 1
+        if first:
+            self._emit("start", name)
+
+    def _finish(self, name, cpu_seconds):
+        now = time.perf_counter()
+        peak = peak_rss_bytes()
+        with self._lock:
+            stage = self._stages[name]
+            stage.cpu_seconds += cpu_seconds
+            stage.end = now if stage.end is None else max(stage.end, now)
+            stage.peak_rss = peak
+            stage.active -= 1
+            last = stage.active == 0
+        if last:
+            self._emit("end", name)
+
+    def _emit(self, event, name):
+        if not self._subscribers:
+            return
+        with self._lock:
+            data = self._stages[name].as_dict()
+        for callback in self._subscribers:
+            callback(event, name, data)
+
+    def _start_profiler(self):
+        if not self.profile:
+            return None
+        with self._lock:
+            self._profiling_stages += 1
+        # 同一线程中只能有一个活动的profiler，嵌套的阶段不再单独启用
+        if getattr(self._local, 'profiling', False):
+            return False
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # 3.12+ 中已有profiler（本对象的或其他工具的）在运行
+            return False
+        self._local.profiling = True
+        with self._lock:
+            self._profilers.append(profiler)
+        return profiler
+
+    def _stop_profiler(self, profiler):
+        if profiler is None:
+            return
+        if profiler:
+            self._local.profiling = False
+        with self._lock:
+            self._profiling_stages -= 1
+            remaining = self._profiling_stages
+        if sys.version_info < (3, 12):
+            # 旧版本中profiler只作用于启用它的线程，可以各自停止
+            if profiler:
+                profiler.disable()
+        elif remaining == 0:
+            # 全局profiler需要等其他线程中的阶段都结束后再停止
+            for active in self._profilers:
+                active.disable()
+
+
+def to_json(summaries):
+    """summaries 为 [(标签字典, summary()结果), ...]，返回JSON文本"""
+    return json.dumps([{'labels': labels, **summary} for labels, summary in summaries],
+                      ensure_ascii=False, indent=2)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def to_prometheus(summaries, prefix='xlsx_cellimages'):
+    """返回Prometheus textfile格式的指标文本（供node_exporter textfile collector读取）"""
+    fields = {
+        'wall_seconds': ('gauge', '阶段墙钟时间（秒）'),
+        'cpu_seconds': ('gauge', '阶段CPU时间（秒）'),
+        'items': ('gauge', '阶段处理的条目数'),
+        'bytes_read': ('gauge', '阶段读取的字节数'),
+        'bytes_written': ('gauge', '阶段写入的字节数'),
+        'peak_rss': ('gauge', '阶段结束时的峰值常驻内存（字节）'),
+    }
+    lines = []
+    for field, (kind, help_text) in fields.items():
+        metric = f"{prefix}_stage_{field}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for labels, summary in summaries:
+            for stage, data in summary['stages'].items():
+                value = data.get(field)
+                if value is None:
+                    continue
+                label_text = ','.join(f'{k}="{_escape_label(v)}"' for k, v in {**labels, 'stage': stage}.items())
+                lines.append(f"{metric}{{{label_text}}} {value}")
+    metric = f"{prefix}_run_wall_seconds"
+    lines.append(f"# HELP {metric} 整个提取过程的墙钟时间（秒）")
+    lines.append(f"# TYPE {metric} gauge")
+    for labels, summary in summaries:
+        label_text = ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+        lines.append(f"{metric}{{{label_text}}} {summary['wall_seconds']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path, summaries):
+    """按扩展名写出指标：.prom 为Prometheus textfile格式，其他为JSON"""
+    text = to_prometheus(summaries) if path.endswith('.prom') else to_json(summaries)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    # node_exporter可能随时读取，写完后再替换
+    os.replace(tmp_path, path)
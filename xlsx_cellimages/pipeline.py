@@ -0,0 +1,537 @@
+"""
+单次打开压缩包的流水线提取
+
+解析 cellimages.xml 的同时，把 (ID, image) 记录分批送入有界队列，由CSV、Excel
+和图像提取阶段在各自的线程中消费。队列满时解析阶段阻塞（背压），队列本身的
+内存占用有上限（Excel报告仍需缓存全部记录后写出）。
+
+解压（zlib）和文件写入释放GIL，可以与解析重叠。最耗时的纯Python部分——Excel
+报告生成——在记录数达到 EXCEL_PROCESS_MIN_ROWS 且有多个CPU时交给独立的工作
+进程，不与解析和图像提取争用GIL；整体耗时因此接近最慢的阶段，而不是各阶段
+之和（见 bench.py 的 pipeline 与各阶段计时）。Excel报告的列宽需要全部记录，
+工作进程在解析结束后才开始写出。
+"""
+import os
+import queue
+import threading
+import time
+
+from .cache import Manifest
+from .dedup import BlobStore
+from .engine import (
+    CELLIMAGES_PART,
+    CELLIMAGES_RELS_PART,
+    MEDIA_PREFIX,
+    ExtractionResult,
+    MediaStats,
+    WorkbookSource,
+    _extract_members,
+    _iter_cellimages_in,
+    _noop,
+    create_csv,
+    create_excel_worksheet,
+    peak_rss_bytes,
+)
+from .metrics import Metrics
+from .sheets import CELLS_CSV_NAME, SHARED_STRINGS_PART, WORKSHEETS_PREFIX, create_cells_csv, scan_sheets
+from .thumbnails import THUMBNAIL_DIR, make_thumbnails
+
+# 每批记录数和每个队列最多缓存的批数
+BATCH_SIZE = 256
+QUEUE_BATCHES = 8
+
+# Excel报告达到此行数时在独立进程中生成；行数较少时启动进程的开销大于收益
+EXCEL_PROCESS_MIN_ROWS = 2000
+
+_DONE = object()
+
+
+class _Stage:
+    """
+    由一个有界队列和若干消费线程组成的流水线阶段
+
+    target(records) 在每个消费线程中执行一次，records 为逐条产出记录的迭代器。
+    target 提前返回或出错时，线程会继续取空队列，避免上游阻塞。
+    全部消费线程结束后设置 finished 事件。每个线程的执行计入 metrics 中的同名阶段，
+    条目数为该线程消费的记录数。
+    """
+
+    def __init__(self, name, target, metrics, threads=1):
+        self.name = name
+        self.metrics = metrics
+        self.queue = queue.Queue(maxsize=QUEUE_BATCHES)
+        self.values = []
+        self.error = None
+        self._target = target
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, name=f"{name}-{n}", daemon=True)
+                         for n in range(threads)]
+        self._running = threads
+        self.finished = threading.Event()
+        self.seconds = 0.0
+
+    def start(self):
+        self._start = time.perf_counter()
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def put(self, batch):
+        self.queue.put(batch)
+
+    def close(self):
+        for _ in self._threads:
+            self.queue.put(_DONE)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        closed = False
+        count = 0
+
+        def records():
+            nonlocal closed, count
+            while True:
+                batch = self.queue.get()
+                if batch is _DONE:
+                    closed = True
+                    return
+                count += len(batch)
+                yield from batch
+
+        try:
+            with self.metrics.stage(self.name) as stage:
+                value = self._target(records())
+                stage.add(items=count)
+            with self._lock:
+                self.values.append(value)
+        except BaseException as e:
+            with self._lock:
+                if self.error is None:
+                    self.error = e
+        finally:
+            while not closed:
+                closed = self.queue.get() is _DONE
+            with self._lock:
+                self._running -= 1
+                if self._running == 0:
+                    self.seconds = time.perf_counter() - self._start
+                    self.finished.set()
+
+
+def _write_excel_report(rows, output_dir, media_dir, extracted, paths, derived):
+    """在工作进程中生成Excel报告，返回 (是否成功, 日志消息列表, 耗时)"""
+    logs = []
+
+    def report(msg_type, *args):
+        if msg_type == "log":
+            logs.append(args[0])
+
+    start = time.perf_counter()
+    ok = create_excel_worksheet(rows, output_dir, media_dir, report, extracted, paths, derived)
+    return ok, logs, time.perf_counter() - start
+
+
+def _feed(stage, items):
+    """在独立线程中把已知的全部记录送入阶段，不占用解析线程"""
+    fanout = _Fanout([stage])
+    for item in items:
+        fanout.add(item)
+    fanout.close()
+
+
+class _Fanout:
+    """把记录分批送往多个阶段"""
+
+    def __init__(self, stages):
+        self.stages = stages
+        self.batch = []
+
+    def add(self, record):
+        self.batch.append(record)
+        if len(self.batch) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            for stage in self.stages:
+                stage.put(self.batch)
+            self.batch = []
+
+    def close(self):
+        self.flush()
+        for stage in self.stages:
+            stage.close()
+
+
+def run_extraction(xlsx_path, output_dir, create_csv_file=False, create_excel=True,
+                   extract_images=True, inflate_workers=1, referenced_only=False, names=None,
+                   dedup=None, dedup_dir=None, incremental=False, locate_cells=False, key_column='A',
+                   sheet_workers=1, thumbnail_size=None, thumbnail_format=None, thumbnail_workers=None,
+                   metrics=None, report=None):
+    """
+    对单个工作簿执行完整的提取流程（图像信息、CSV、Excel、图像文件）
+
+    压缩包只打开一次，各阶段通过有界队列并发执行。xlsx_path 为路径、
+    bytes/memoryview 或可定位的二进制文件对象（见 WorkbookSource）；后两者的
+    结果中 xlsx_path 为文件对象的名称或None。
+    inflate_workers 为提取图像文件时并行解压的线程数。
+    referenced_only 为True时只提取cellimages.xml引用的图像文件，跳过浮动图片、
+    图表图片等未被单元格引用的文件。names 为图像名称（ID_...）集合，指定时
+    只处理这些图像，并隐含 referenced_only。
+    dedup 为 "cas" 或 "hardlink" 时启用按内容去重：相同图像只在 dedup_dir
+    （默认 output_dir/blobs）中存储一次。"cas" 模式下报告直接指向存储中的文件，
+    "hardlink" 模式下media目录中的文件为指向存储文件的硬链接。
+    incremental 为True时使用输出目录中的清单（见 cache.py）：cellimages.xml
+    未变化时不再解析，CRC和大小未变化的图像文件不再解压。
+    locate_cells 为True时同时扫描工作表中的DISPIMG公式（见 sheets.py），生成
+    extracted_cells.csv，记录每个图像所在的工作表、单元格和行键（key_column 列的值）；
+    sheet_workers 为并行扫描工作表的进程数。扫描与cellimages.xml的解析同时进行。
+    thumbnail_size 指定时在图像提取后把最长边超过该像素数的图像缩小（见 thumbnails.py），
+    按 thumbnail_format 重新编码后写入 output_dir/thumbnails，thumbnail_workers 为进程数；
+    CSV和Excel报告中同时记录原图和缩略图路径。
+    metrics 为 Metrics 实例，用于注册回调或启用cProfile；各阶段（open、parse、
+    csv、excel、media、sheets、thumbnails）的指标汇总保存在返回结果的 metrics 字段中。
+
+    返回 ExtractionResult；工作簿无法读取时抛出异常。
+    """
+    report = report or _noop
+    metrics = metrics or Metrics()
+    result = ExtractionResult(xlsx_path=xlsx_path, output_dir=output_dir)
+    if names is not None:
+        names = set(names)
+        referenced_only = True
+
+    # 创建输出目录
+    os.makedirs(output_dir, exist_ok=True)
+
+    report("status", "正在提取图像信息...")
+    report("progress", 10)
+
+    with WorkbookSource(xlsx_path) as source, source.open() as zf:
+        result.xlsx_path = source.name
+        with metrics.stage("open") as open_stage:
+            infos = {info.filename: info for info in zf.infolist()}
+            members = list(infos)
+            open_stage.add(items=len(members))
+            manifest = cached = None
+            if CELLIMAGES_PART in infos:
+                manifest = Manifest.load(output_dir) if incremental else None
+                cached = manifest.cached_images(infos) if manifest is not None else None
+                if cached is not None and any(MEDIA_PREFIX + image not in infos for _, image in cached):
+                    cached = None
+
+        if CELLIMAGES_PART not in infos:
+            report("log", "警告: 未找到任何图像")
+            report("status", "完成 - 未找到图像")
+            report("progress", 100)
+            result.metrics = metrics.summary()
+            return result
+        if cached is not None:
+            report("log", "cellimages.xml 未变化，使用缓存的图像列表")
+
+        media_dir = os.path.abspath(os.path.join(output_dir, 'media'))
+        media_members = [m for m in members if m.startswith(MEDIA_PREFIX)]
+
+        # 将要提取的图像文件：全部media成员，或在解析过程中收集到的被引用成员
+        planned = set()
+        if extract_images and not referenced_only:
+            planned.update(m.removeprefix(MEDIA_PREFIX) for m in media_members)
+
+        store = None
+        if extract_images and dedup is not None:
+            store = BlobStore(dedup_dir or os.path.join(output_dir, 'blobs'), link=dedup == 'hardlink')
+        # cas模式下报告需要等图像写入存储、得到摘要路径之后才能生成
+        wait_for_media = store is not None and not store.link
+        media_finished = threading.Event()
+        report_paths = store.paths if wait_for_media else None
+
+        # 增量模式下上次已写出且未变化的图像文件 {文件名: 路径}
+        skipped = {}
+        base_dir = store.root if wait_for_media else media_dir
+
+        def needs_extract(image):
+            if manifest is None:
+                return True
+            path = manifest.unchanged_path(image, infos[MEDIA_PREFIX + image], base_dir)
+            if path is None:
+                return True
+            skipped[image] = path
+            if report_paths is not None:
+                report_paths[image] = path
+            return False
+
+        # 缩略图在图像全部写出后生成，报告需要等待其完成
+        make_thumbs = extract_images and bool(thumbnail_size)
+        thumbs_finished = threading.Event()
+        thumbs = {}
+        defer_reports = wait_for_media or make_thumbs
+
+        def wait_for_reports():
+            if wait_for_media:
+                media_finished.wait()
+            if make_thumbs:
+                thumbs_finished.wait()
+
+        record_stages = []
+        csv_stage = excel_stage = media_stage = None
+
+        if create_csv_file:
+            def write_csv(records):
+                if defer_reports:
+                    records = list(records)
+                    wait_for_reports()
+                ok = create_csv(records, output_dir, report, report_paths, thumbs.get('paths'))
+                if ok:
+                    metrics.add("csv", bytes_written=os.path.getsize(os.path.join(output_dir, 'extracted_images.csv')))
+                return ok
+            csv_stage = _Stage("csv", write_csv, metrics)
+            record_stages.append(csv_stage)
+
+        if create_excel:
+            def write_excel(records):
+                rows = list(records)
+                # 解析已结束，planned 已包含全部将要提取的文件
+                if defer_reports:
+                    wait_for_reports()
+                excel_media_dir = media_dir if extract_images else None
+                extracted = planned if extract_images else None
+                derived = thumbs.get('paths')
+                outcome = None
+                if len(rows) >= EXCEL_PROCESS_MIN_ROWS and (os.cpu_count() or 1) > 1:
+                    from concurrent.futures import ProcessPoolExecutor
+                    from concurrent.futures.process import BrokenProcessPool
+
+                    try:
+                        with ProcessPoolExecutor(max_workers=1) as pool:
+                            outcome = pool.submit(_write_excel_report, rows, output_dir, excel_media_dir,
+                                                  extracted, report_paths, derived).result()
+                    except (OSError, BrokenProcessPool) as e:
+                        # 无法创建工作进程时在本线程中生成
+                        report("log", f"Excel工作进程不可用，改为在本进程中生成: {e}")
+                if outcome is not None:
+                    ok, logs, elapsed = outcome
+                    for msg in logs:
+                        report("log", msg)
+                else:
+                    start = time.perf_counter()
+                    ok = create_excel_worksheet(rows, output_dir, excel_media_dir, report, extracted, report_paths,
+                                                derived)
+                    elapsed = time.perf_counter() - start
+                result.excel_rows_per_sec = len(rows) / elapsed if elapsed > 0 else 0.0
+                if ok:
+                    metrics.add("excel", bytes_written=os.path.getsize(os.path.join(output_dir, 'extracted_images.xlsx')))
+                return ok
+            excel_stage = _Stage("excel", write_excel, metrics)
+            record_stages.append(excel_stage)
+
+        if extract_images:
+            if not wait_for_media:
+                os.makedirs(media_dir, exist_ok=True)
+            if not referenced_only:
+                media_members = [m for m in media_members if needs_extract(m.removeprefix(MEDIA_PREFIX))]
+            total = None if referenced_only else len(media_members)
+            lock = threading.Lock()
+            done = 0
+
+            def on_done(member):
+                nonlocal done
+                with lock:
+                    done += 1
+                    count = done
+                metrics.add("media", bytes_read=infos[member].compress_size)
+                if total:
+                    report("progress", 10 + count / total * 80)
+                report("log", f"提取文件: {member.removeprefix(MEDIA_PREFIX)}")
+
+            # 所有线程共享同一个ZipFile句柄，读取原始数据时由zipfile内部加锁，解压并发进行
+            def write_media(records):
+                written = _extract_members(zf, records, MEDIA_PREFIX, media_dir, on_done, store, source)
+                metrics.add("media", bytes_written=written)
+                return written
+
+            media_stage = _Stage("media", write_media, metrics, threads=max(1, inflate_workers))
+            media_finished = media_stage.finished
+        else:
+            media_finished.set()
+
+        scan = {}
+        scan_thread = None
+        if locate_cells:
+            def scan_cells():
+                try:
+                    with metrics.stage("sheets") as sheets_stage:
+                        scan['cells'] = scan_sheets(zf, None, key_column, sheet_workers, report)
+                        sheets_stage.add(items=len(scan['cells']), bytes_read=sum(
+                            info.file_size for member, info in infos.items()
+                            if member.startswith(WORKSHEETS_PREFIX) or member == SHARED_STRINGS_PART))
+                except Exception as e:
+                    scan['error'] = e
+            scan_thread = threading.Thread(target=scan_cells, name="sheets", daemon=True)
+            scan_thread.start()
+
+        thumbs_thread = None
+        if make_thumbs:
+            def thumbnail_media():
+                try:
+                    media_finished.wait()
+                    # 解析和提取均已结束，planned 为全部提取的文件
+                    sources = {}
+                    for image in planned:
+                        if report_paths is not None:
+                            path = report_paths.get(image)
+                        else:
+                            path = os.path.join(media_dir, image)
+                        if path is not None:
+                            sources[image] = path
+                    report("status", "正在生成缩略图...")
+                    # 报告中的路径与media目录一样为绝对路径
+                    thumb_dir = os.path.abspath(os.path.join(output_dir, THUMBNAIL_DIR))
+                    with metrics.stage("thumbnails") as thumbs_stage:
+                        thumbs['paths'] = make_thumbnails(sources, thumb_dir, thumbnail_size, thumbnail_format,
+                                                          thumbnail_workers, report)
+                        thumbs_stage.add(items=len(sources))
+                except Exception as e:
+                    thumbs['error'] = e
+                finally:
+                    thumbs_finished.set()
+            thumbs_thread = threading.Thread(target=thumbnail_media, name="thumbnails", daemon=True)
+            thumbs_thread.start()
+
+        stages = record_stages + ([media_stage] if media_stage is not None else [])
+        for stage in stages:
+            stage.start()
+        fanout = _Fanout(record_stages)
+        media_fanout = None
+        if media_stage is not None:
+            if referenced_only:
+                media_fanout = _Fanout([media_stage])
+            else:
+                threading.Thread(target=_feed, args=(media_stage, media_members),
+                                 name="media-feed", daemon=True).start()
+
+        tuples_list = []
+        all_images = []
+        try:
+            report("log", "提取的图像列表:")
+            report("log", "[")
+            with metrics.stage("parse") as parse_stage:
+                # 增量模式下需要全部记录更新清单，名称过滤在这里进行
+                for record in cached if cached is not None else _iter_cellimages_in(zf):
+                    name, image = record
+                    if manifest is not None:
+                        all_images.append(record)
+                    if names is not None and name not in names:
+                        continue
+                    tuples_list.append(record)
+                    report("log", f'"{name}","{image}"')
+                    fanout.add(record)
+                    if media_fanout is not None and image not in planned:
+                        planned.add(image)
+                        if needs_extract(image):
+                            media_fanout.add(MEDIA_PREFIX + image)
+                rels_info = infos.get(CELLIMAGES_RELS_PART)
+                parse_stage.add(items=len(tuples_list), bytes_read=0 if cached is not None else (
+                    infos[CELLIMAGES_PART].file_size + (rels_info.file_size if rels_info is not None else 0)))
+            report("log", "]")
+        finally:
+            # 无论解析是否成功都要关闭队列，让各阶段线程退出
+            fanout.close()
+            if media_fanout is not None:
+                media_fanout.close()
+            for stage in stages:
+                stage.join()
+            if scan_thread is not None:
+                scan_thread.join()
+            if thumbs_thread is not None:
+                thumbs_thread.join()
+        for stage in stages:
+            if stage.error is not None:
+                raise stage.error
+
+    result.images = tuples_list
+    if not tuples_list:
+        report("log", "警告: 未找到任何图像")
+
+    report("log", f"\n总共提取了 {len(tuples_list)} 个图像")
+
+    if csv_stage is not None:
+        if all(csv_stage.values):
+            result.csv_path = os.path.abspath(os.path.join(output_dir, 'extracted_images.csv'))
+        else:
+            result.ok = False
+
+    if excel_stage is not None:
+        if all(excel_stage.values):
+            result.excel_path = os.path.abspath(os.path.join(output_dir, 'extracted_images.xlsx'))
+            report("log", "Excel工作表创建成功")
+        else:
+            result.ok = False
+
+    if media_stage is not None:
+        stats = MediaStats(files=len(planned), bytes_written=sum(media_stage.values),
+                           seconds=media_stage.seconds, skipped=len(skipped))
+        result.media_dir = media_dir
+        result.media_stats = stats
+        report("log", f"图像文件已提取到 {media_dir}")
+        report("log", f"共 {stats.files} 个文件, {stats.bytes_written / 1048576:.1f} MB, "
+                      f"{stats.bytes_per_sec / 1048576:.1f} MB/s")
+        if skipped:
+            report("log", f"跳过未变化的文件 {len(skipped)} 个")
+        if store is not None:
+            stats.duplicates = store.duplicates
+            stats.bytes_saved = store.bytes_saved
+            if report_paths is not None:
+                result.image_paths = dict(report_paths)
+            report("log", f"去重: {store.unique} 个新文件, {store.duplicates} 个重复, "
+                          f"节省 {store.bytes_saved / 1048576:.1f} MB（存储目录 {store.root}）")
+
+    if make_thumbs:
+        if 'error' in thumbs:
+            report("log", f"生成缩略图时出错: {thumbs['error']}")
+            result.ok = False
+        elif thumbs.get('paths') is None:
+            # Pillow未安装
+            result.ok = False
+        else:
+            result.thumbnail_paths = thumbs['paths']
+
+    if scan_thread is not None:
+        if 'error' in scan:
+            report("log", f"扫描工作表时出错: {scan['error']}")
+            result.ok = False
+        else:
+            # 与cellimages.xml的映射关联（哈希索引）
+            index = dict(tuples_list)
+            cells = [cell for cell in scan['cells'] if names is None or cell.name in names]
+            for cell in cells:
+                cell.image = index.get(cell.name)
+            result.cells = cells
+            report("log", f"定位了 {len(cells)} 个显示图像的单元格")
+            if create_cells_csv(cells, output_dir, media_dir, report, report_paths):
+                result.cells_csv_path = os.path.abspath(os.path.join(output_dir, CELLS_CSV_NAME))
+            else:
+                result.ok = False
+
+    if manifest is not None:
+        written = {}
+        if media_stage is not None:
+            for image in planned:
+                if store is not None and not store.link:
+                    written[image] = store.paths.get(image)
+                else:
+                    written[image] = os.path.join(media_dir, image)
+        manifest.update(infos, all_images, {k: v for k, v in written.items() if v})
+        manifest.save()
+
+    # 完成
+    result.peak_rss = peak_rss_bytes()
+    result.metrics = metrics.summary()
+    if result.peak_rss is not None:
+        report("log", f"峰值内存: {result.peak_rss / 1048576:.1f} MB")
+    report("status", f"完成 - 提取了 {len(tuples_list)} 个图像")
+    report("progress", 100)
+    report("log", "\n操作完成！")
+    return result
@@ -0,0 +1,376 @@
+"""
+本地HTTP提取服务: python -m xlsx_cellimages.server [--host 127.0.0.1] [--port 8765]
+
+只依赖标准库。POST /extract 的请求体为xlsx文件内容（需要Content-Length），
+响应为 multipart/mixed：第一部分是JSON索引，第二部分是图像文件的zip或tar归档
+（与 --archive 输出相同），两部分都以分块传输编码边生成边发送。
+
+    curl --data-binary @a.xlsx -H "Content-Type: application/octet-stream" \\
+         "http://127.0.0.1:8765/extract?format=zip&referenced_only=1" -o a.multipart
+
+查询参数: format=zip|tar，referenced_only=1，csv=1，excel=0，cells=1，index_only=1（不返回归档）。
+GET /health 返回当前运行和排队的任务数。
+
+同时处理的提取任务数由 workers 限制，另外最多 queue_limit 个任务排队等待；
+超过时返回503和Retry-After（客户端发送 Expect: 100-continue 时在上传文件之前
+即被拒绝）。所有任务在服务进程内的线程中执行，不为每个请求启动新的解释器。
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import uuid
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .archive import ARCHIVE_FORMATS, ArchiveWriter, write_archive
+from .engine import COPY_BUFFER_SIZE
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_MAX_UPLOAD = 512 * 1024 * 1024
+# 上传内容超过该大小时写入临时文件，否则保存在内存中
+SPOOL_SIZE = 16 * 1024 * 1024
+RETRY_AFTER_SECONDS = 1
+
+
+class _ChunkedWriter:
+    """以HTTP/1.1分块传输编码写出响应体的只写流（不可定位）"""
+
+    def __init__(self, wfile):
+        self._wfile = wfile
+
+    def write(self, data):
+        if data:
+            self._wfile.write(b'%x\r\n' % len(data))
+            self._wfile.write(data)
+            self._wfile.write(b'\r\n')
+        return len(data)
+
+    def flush(self):
+        self._wfile.flush()
+
+    def close(self):
+        self._wfile.write(b'0\r\n\r\n')
+        self._wfile.flush()
+
+
+class _Deferred:
+    """把写入转发给响应体；归档在发送索引之后才会产生输出"""
+
+    def __init__(self, target):
+        self._target = target
+
+    def write(self, data):
+        target = self._target()
+        if target is None:
+            # 索引发送之前出错，关闭归档时写出的目录记录直接丢弃
+            return len(data)
+        return target.write(data)
+
+    def flush(self):
+        target = self._target()
+        if target is not None:
+            target.flush()
+
+
+class _Discard:
+    """只需要索引时丢弃归档输出"""
+
+    def write(self, data):
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class _Admission:
+    """
+    任务准入控制：最多 workers 个任务同时运行，queue_limit 个排队
+
+    try_enter 在没有空位时立即返回False，调用者应返回503。
+    """
+
+    def __init__(self, workers, queue_limit):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._running = threading.BoundedSemaphore(workers)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+
+    def try_enter(self):
+        if not self._slots.acquire(blocking=False):
+            return False
+        with self._lock:
+            self.waiting += 1
+        return True
+
+    def start(self):
+        """排队等待空闲的工作线程"""
+        self._running.acquire()
+        with self._lock:
+            self.waiting -= 1
+            self.active += 1
+
+    def leave(self, started=True):
+        with self._lock:
+            if started:
+                self.active -= 1
+            else:
+                self.waiting -= 1
+        if started:
+            self._running.release()
+        self._slots.release()
+
+
+class ExtractionServer(ThreadingHTTPServer):
+    """提取服务；每个连接一个线程，提取任务数由 admission 限制"""
+
+    daemon_threads = True
+
+    def __init__(self, address, workers=2, queue_limit=8, max_upload=DEFAULT_MAX_UPLOAD, quiet=False):
+        super().__init__(address, ExtractionHandler)
+        self.admission = _Admission(workers, queue_limit)
+        self.max_upload = max_upload
+        self.quiet = quiet
+
+
+def _flag(query, name, default=False):
+    values = query.get(name)
+    if not values:
+        return default
+    return values[-1].lower() not in ('0', 'false', 'no', '')
+
+
+class ExtractionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'xlsx-cellimages'
+    admitted = False
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            # 客户端提前断开（如收到503后不再读取响应体），不作为服务端错误输出
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reject(self, status, message, headers=None, drain=None):
+        """
+        返回错误响应
+
+        drain 为尚未读取的请求体长度：读取并丢弃后连接可以继续使用，客户端也能
+        正常收到响应；为None（长度未知、过大或客户端尚未发送）时关闭连接。
+        """
+        if drain is None or not self._read_body(None, drain):
+            self.close_connection = True
+            headers = {'Connection': 'close', **(headers or {})}
+        self._send_json(status, {'error': message}, headers)
+
+    def handle_expect_100(self):
+        # curl等客户端上传较大的文件前发送 Expect: 100-continue，此时在接收请求体
+        # 之前完成准入，没有空位时客户端不必上传文件
+        if self.command == 'POST':
+            if not self.server.admission.try_enter():
+                self._reject(HTTPStatus.SERVICE_UNAVAILABLE, 'too many requests',
+                             {'Retry-After': str(RETRY_AFTER_SECONDS)})
+                return False
+            self.admitted = True
+        return super().handle_expect_100()
+
+    def do_GET(self):
+        if urlsplit(self.path).path != '/health':
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': 'not found'})
+            return
+        admission = self.server.admission
+        self._send_json(HTTPStatus.OK, {
+            'status': 'ok',
+            'active': admission.active,
+            'queued': admission.waiting,
+            'workers': admission.workers,
+            'queue_limit': admission.queue_limit,
+        })
+
+    def do_POST(self):
+        admission = self.server.admission
+        # 请求可能已在 handle_expect_100 中获得准入
+        admitted, self.admitted = self.admitted, False
+        started = False
+
+        def release():
+            # 在发送响应的最后部分之前释放，客户端收到完整响应后立即发送的下一个请求不会被拒绝
+            nonlocal admitted
+            if admitted:
+                admitted = False
+                admission.leave(started)
+
+        try:
+            length = self.headers.get('Content-Length')
+            if length is None or not length.isdigit():
+                self._reject(HTTPStatus.LENGTH_REQUIRED, 'Content-Length required')
+                return
+            length = int(length)
+            if length > self.server.max_upload:
+                self._reject(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                             f'upload larger than {self.server.max_upload} bytes')
+                return
+            url = urlsplit(self.path)
+            if url.path != '/extract':
+                self._reject(HTTPStatus.NOT_FOUND, 'not found', drain=length)
+                return
+            query = parse_qs(url.query)
+            fmt = (query.get('format') or ['zip'])[-1]
+            if fmt not in ARCHIVE_FORMATS:
+                self._reject(HTTPStatus.BAD_REQUEST, f'unknown format: {fmt}', drain=length)
+                return
+            if not admitted:
+                if not admission.try_enter():
+                    self._reject(HTTPStatus.SERVICE_UNAVAILABLE, 'too many requests',
+                                 {'Retry-After': str(RETRY_AFTER_SECONDS)}, drain=length)
+                    return
+                admitted = True
+
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as upload:
+                if not self._read_body(upload, length):
+                    return
+                upload.seek(0)
+                admission.start()
+                started = True
+                self._extract(upload, fmt, query, release)
+        finally:
+            release()
+
+    def _read_body(self, target, length):
+        """读取请求体写入 target（为None时丢弃），连接提前断开时返回False"""
+        buf = bytearray(min(COPY_BUFFER_SIZE, max(length, 1)))
+        view = memoryview(buf)
+        remaining = length
+        while remaining:
+            n = self.rfile.readinto(view[:min(remaining, len(buf))])
+            if not n:
+                self.close_connection = True
+                return False
+            if target is not None:
+                target.write(view[:n])
+            remaining -= n
+        return True
+
+    def _extract(self, upload, fmt, query, release):
+        """执行提取并发送响应；release 释放任务占用的位置，在响应写完之前调用"""
+        boundary = uuid.uuid4().hex
+        body = None
+        index_only = _flag(query, 'index_only')
+
+        def send_index(result, media):
+            nonlocal body
+            selected = set(media)
+            index = {
+                'images': [{'id': name, 'image': image, 'path': f'media/{image}' if image in selected else None}
+                           for name, image in result.images],
+                'media': media,
+                'archive': None if index_only else fmt,
+            }
+            # 解析成功后才发送响应头，之前的错误仍可返回4xx
+            self.send_response(HTTPStatus.OK)
+            self.send_header('Content-Type', f'multipart/mixed; boundary={boundary}')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            body = _ChunkedWriter(self.wfile)
+            body.write(f'--{boundary}\r\nContent-Type: application/json; charset=utf-8\r\n\r\n'.encode())
+            body.write(json.dumps(index, ensure_ascii=False).encode('utf-8'))
+            if not index_only:
+                content_type = 'application/zip' if fmt == 'zip' else 'application/x-tar'
+                body.write(f'\r\n--{boundary}\r\nContent-Type: {content_type}\r\n'
+                           f'Content-Disposition: attachment; filename="images.{fmt}"\r\n\r\n'.encode())
+
+        try:
+            if index_only:
+                writer = ArchiveWriter(_Discard(), fmt)
+            else:
+                writer = ArchiveWriter(_Deferred(lambda: body), fmt)
+            with writer:
+                write_archive(
+                    upload, writer,
+                    create_csv_file=_flag(query, 'csv'),
+                    create_excel=_flag(query, 'excel', True) and not index_only,
+                    extract_images=not index_only,
+                    referenced_only=_flag(query, 'referenced_only'),
+                    locate_cells=_flag(query, 'cells') and not index_only,
+                    on_index=send_index,
+                )
+        except Exception as e:
+            release()
+            if body is None:
+                self._send_json(HTTPStatus.UNPROCESSABLE_ENTITY, {'error': f"{type(e).__name__}: {e}"})
+            else:
+                # 响应已开始，只能中断连接让客户端发现响应不完整
+                self.log_error("extraction failed after response started: %s", e)
+                self.close_connection = True
+            return
+        release()
+        body.write(f'\r\n--{boundary}--\r\n'.encode())
+        body.close()
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=2, queue_limit=8,
+                max_upload=DEFAULT_MAX_UPLOAD, quiet=False):
+    """创建服务（尚未开始处理请求）；port=0 时由系统分配端口，见 server.server_address"""
+    return ExtractionServer((host, port), workers, queue_limit, max_upload, quiet)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m xlsx_cellimages.server",
+        description="本地HTTP提取服务：POST /extract 上传xlsx，返回JSON索引和图像归档",
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"监听地址（默认: {DEFAULT_HOST}）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"监听端口（默认: {DEFAULT_PORT}）")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="同时执行的提取任务数（默认: CPU数）")
+    parser.add_argument("--queue-limit", type=int, default=8,
+                        help="排队等待的任务数上限，超过时返回503（默认: 8）")
+    parser.add_argument("--max-upload-mb", type=int, default=DEFAULT_MAX_UPLOAD // 1048576,
+                        help="上传文件大小上限，单位MB（默认: 512）")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不输出访问日志")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.workers < 1 or args.queue_limit < 0:
+        print("错误: --workers 至少为1，--queue-limit 不能为负数", file=sys.stderr)
+        return 2
+    server = make_server(args.host, args.port, args.workers, args.queue_limit,
+                         args.max_upload_mb * 1048576, args.quiet)
+    host, port = server.server_address[:2]
+    print(f"提取服务已启动: http://{host}:{port}/extract（{args.workers} 个工作线程，"
+          f"最多排队 {args.queue_limit} 个）", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
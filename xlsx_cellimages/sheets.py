@@ -0,0 +1,307 @@
+"""
+工作表扫描：定位DISPIMG公式所在的单元格
+
+WPS在单元格中以 =DISPIMG("ID_...",1) 显示嵌入图像。这里增量解析
+xl/worksheets/sheet*.xml，找出含DISPIMG的单元格，再通过 {ID: 图像文件}
+哈希索引与cellimages.xml的映射关联，得到 工作表、单元格、行键、图像名称、
+图像文件。不构建工作表DOM，每处理完一行即清除，内存占用与行数无关；
+多个工作表可以在进程池中并行扫描。
+
+DISPIMG通常出现在公式（<f>）或公式的缓存值中；值被粘贴为文本时可能
+存放在 sharedStrings.xml 中，此时先流式扫描一遍共享字符串表，只保留含
+DISPIMG的条目。行键（默认为A列的值）如果是共享字符串，扫描结束后再按需
+读取所需的条目。
+"""
+import csv
+import os
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+
+from .engine import _noop, read_relationships
+
+SHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+WORKBOOK_PART = 'xl/workbook.xml'
+WORKBOOK_RELS_PART = 'xl/_rels/workbook.xml.rels'
+SHARED_STRINGS_PART = 'xl/sharedStrings.xml'
+WORKSHEETS_PREFIX = 'xl/worksheets/'
+CELLS_CSV_NAME = 'extracted_cells.csv'
+
+_DISPIMG = re.compile(r'DISPIMG\(\s*"([^"]+)"')
+_SHEET_MEMBER = re.compile(r'xl/worksheets/sheet(\d+)\.xml')
+
+_SHEET_TAG = f"{{{SHEET_NS}}}sheet"
+_SHEET_DATA_TAG = f"{{{SHEET_NS}}}sheetData"
+_ROW_TAG = f"{{{SHEET_NS}}}row"
+_C_TAG = f"{{{SHEET_NS}}}c"
+_F_TAG = f"{{{SHEET_NS}}}f"
+_V_TAG = f"{{{SHEET_NS}}}v"
+_IS_TAG = f"{{{SHEET_NS}}}is"
+_T_TAG = f"{{{SHEET_NS}}}t"
+_R_TAG = f"{{{SHEET_NS}}}r"
+_SI_TAG = f"{{{SHEET_NS}}}si"
+_RID_ATTR = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+
+@dataclass
+class CellImage:
+    """工作表中显示嵌入图像的一个单元格"""
+    sheet: str
+    cell: str
+    row_key: str | None
+    name: str
+    image: str | None = None
+
+
+def column_index(letters):
+    """列字母转为从1开始的列号，如 A -> 1，AA -> 27"""
+    index = 0
+    for ch in letters.upper():
+        index = index * 26 + ord(ch) - 64
+    return index
+
+
+def column_letters(index):
+    """从1开始的列号转为列字母"""
+    letters = ''
+    while index > 0:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def list_sheets(z, names):
+    """
+    返回工作簿中的 [(工作表名称, 成员路径), ...]，按工作簿中的顺序
+
+    workbook.xml 或其关系部件缺失时，按编号列出 xl/worksheets/sheetN.xml，
+    名称取文件名。
+    """
+    member_set = set(names)
+    sheets = []
+    if WORKBOOK_PART in member_set:
+        rels = read_relationships(z, names, WORKBOOK_RELS_PART)
+        with z.open(WORKBOOK_PART) as f:
+            root = ET.parse(f).getroot()
+        for sheet in root.iter(_SHEET_TAG):
+            member = rels.get(sheet.get(_RID_ATTR))
+            if member is not None and member.startswith(WORKSHEETS_PREFIX):
+                sheets.append((sheet.get('name') or posixpath.basename(member), member))
+    if not sheets:
+        numbered = []
+        for name in names:
+            match = _SHEET_MEMBER.fullmatch(name)
+            if match:
+                numbered.append((int(match.group(1)), name))
+        sheets = [(posixpath.splitext(posixpath.basename(name))[0], name) for _, name in sorted(numbered)]
+    return sheets
+
+
+def _string_item_text(si):
+    # 富文本由多个 <r><t> 组成；忽略注音 <rPh>
+    t = si.find(_T_TAG)
+    if t is not None:
+        return t.text or ''
+    return ''.join(r.findtext(_T_TAG) or '' for r in si.iter(_R_TAG))
+
+
+def iter_shared_strings(source):
+    """增量解析sharedStrings.xml，逐个产出 (索引, 文本)，已处理的条目被清除"""
+    root = None
+    index = 0
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            continue
+        if elem.tag == _SI_TAG:
+            yield index, _string_item_text(elem)
+            index += 1
+            root.clear()
+
+
+def _cell_image_name(c, dispimg_strings):
+    """返回单元格中DISPIMG引用的图像名称，没有时返回None"""
+    for text in (c.findtext(_F_TAG), c.findtext(_V_TAG) if c.get('t') == 'str' else None):
+        if text and 'DISPIMG' in text:
+            match = _DISPIMG.search(text)
+            if match:
+                return match.group(1)
+    kind = c.get('t')
+    if kind == 's':
+        value = c.findtext(_V_TAG)
+        if value is not None and value.strip().isdigit():
+            return dispimg_strings.get(int(value))
+    elif kind == 'inlineStr':
+        inline = c.find(_IS_TAG)
+        if inline is not None:
+            match = _DISPIMG.search(''.join(inline.itertext()))
+            if match:
+                return match.group(1)
+    return None
+
+
+def _cell_value(c):
+    """
+    返回单元格的值；共享字符串返回其索引（int），由调用者之后统一解析
+    """
+    kind = c.get('t')
+    if kind == 'inlineStr':
+        inline = c.find(_IS_TAG)
+        return ''.join(inline.itertext()) if inline is not None else None
+    value = c.findtext(_V_TAG)
+    if kind == 's' and value is not None and value.strip().isdigit():
+        return int(value)
+    return value
+
+
+def iter_sheet_dispimg(source, key_column='A', dispimg_strings=None):
+    """
+    增量解析一个工作表，逐个产出 (单元格, 行键, 图像名称)
+
+    行键为同一行 key_column 列的值（共享字符串为其索引 int），没有该列时为None。
+    dispimg_strings 为 {共享字符串索引: 图像名称}。每行处理完后清除，
+    内存占用只与单行的宽度有关。
+    """
+    dispimg_strings = dispimg_strings or {}
+    key_index = column_index(key_column) if key_column else None
+    sheet_data = None
+    row_number = 0
+    col = 0
+    row_key = None
+    found = []
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            if tag == _ROW_TAG:
+                r = elem.get('r')
+                row_number = int(r) if r else row_number + 1
+                col = 0
+                row_key = None
+                found = []
+            elif tag == _SHEET_DATA_TAG:
+                sheet_data = elem
+            continue
+        if tag == _C_TAG:
+            ref = elem.get('r')
+            if ref:
+                col = column_index(ref.rstrip('0123456789'))
+            else:
+                # 省略r属性的单元格紧接前一个单元格
+                col += 1
+                ref = f"{column_letters(col)}{row_number}"
+            if col == key_index:
+                row_key = _cell_value(elem)
+            name = _cell_image_name(elem, dispimg_strings)
+            if name is not None:
+                found.append((ref, name))
+        elif tag == _ROW_TAG:
+            for ref, name in found:
+                yield ref, row_key, name
+            if sheet_data is not None:
+                sheet_data.clear()
+
+
+def _scan_sheet_part(xlsx_path, member, key_column, dispimg_strings):
+    """进程池中执行的单个工作表扫描任务"""
+    with zipfile.ZipFile(xlsx_path, 'r') as z:
+        with z.open(member) as f:
+            return list(iter_sheet_dispimg(f, key_column, dispimg_strings))
+
+
+def scan_sheets(xlsx, mapping=None, key_column='A', workers=1, report=None):
+    """
+    扫描工作簿中所有工作表，返回 CellImage 列表（按工作表顺序、行顺序）
+
+    Parameters:
+        xlsx        – 工作簿路径，或已打开的 ZipFile（可与其他线程共用）
+        mapping     – {图像名称: 图像文件}，通常为 dict(提取的 (ID, image) 列表)；
+                      找不到名称的单元格 image 为None
+        key_column  – 作为行键的列（如 "A"），None 表示不取行键
+        workers     – 并行扫描工作表的进程数；1 表示在当前进程顺序扫描
+    """
+    if isinstance(xlsx, zipfile.ZipFile):
+        return _scan_sheets(xlsx, mapping, key_column, workers, report or _noop)
+    with zipfile.ZipFile(xlsx, 'r') as z:
+        return _scan_sheets(z, mapping, key_column, workers, report or _noop)
+
+
+def _scan_sheets(z, mapping, key_column, workers, report):
+    mapping = mapping or {}
+    names = z.namelist()
+    sheets = list_sheets(z, names)
+    has_strings = SHARED_STRINGS_PART in names
+    dispimg_strings = {}
+    if has_strings:
+        with z.open(SHARED_STRINGS_PART) as f:
+            for index, text in iter_shared_strings(f):
+                if 'DISPIMG' in text:
+                    match = _DISPIMG.search(text)
+                    if match:
+                        dispimg_strings[index] = match.group(1)
+
+    if workers > 1 and len(sheets) > 1 and z.filename:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # 每个进程各自打开工作簿
+        with ProcessPoolExecutor(max_workers=min(workers, len(sheets))) as pool:
+            futures = [pool.submit(_scan_sheet_part, z.filename, member, key_column, dispimg_strings)
+                       for _, member in sheets]
+            found = [future.result() for future in futures]
+    else:
+        found = []
+        for _, member in sheets:
+            with z.open(member) as f:
+                found.append(list(iter_sheet_dispimg(f, key_column, dispimg_strings)))
+
+    # 行键为共享字符串时，只读取用到的条目
+    needed = {key for rows in found for _, key, _ in rows if isinstance(key, int)}
+    strings = {}
+    if needed and has_strings:
+        with z.open(SHARED_STRINGS_PART) as f:
+            for index, text in iter_shared_strings(f):
+                if index in needed:
+                    strings[index] = text
+                    if len(strings) == len(needed):
+                        break
+
+    cells = []
+    for (sheet, _), rows in zip(sheets, found):
+        for ref, key, name in rows:
+            if isinstance(key, int):
+                key = strings.get(key)
+            cells.append(CellImage(sheet, ref, key, name, mapping.get(name)))
+        if rows:
+            report("log", f"工作表 {sheet}: {len(rows)} 个DISPIMG单元格")
+    return cells
+
+
+def create_cells_csv(cells, output_dir, media_dir=None, report=None, paths=None):
+    """
+    创建 extracted_cells.csv，记录每个DISPIMG单元格对应的图像文件
+
+    paths 为 {图像文件名: 文件路径}，提供时（如去重存储）使用其中的路径。
+    """
+    report = report or _noop
+    media_dir = media_dir or os.path.abspath(os.path.join(output_dir, 'media'))
+    try:
+        csv_path = os.path.abspath(os.path.join(output_dir, CELLS_CSV_NAME))
+        with open(csv_path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(['sheet', 'cell', 'row_key', 'ID', 'image', 'img_path'])
+            for cell in cells:
+                if cell.image is None:
+                    img_path = ''
+                elif paths is not None and cell.image in paths:
+                    img_path = paths[cell.image]
+                else:
+                    img_path = os.path.join(media_dir, cell.image)
+                writer.writerow([cell.sheet, cell.cell, cell.row_key if cell.row_key is not None else '',
+                                 cell.name, cell.image or '', img_path])
+        report("log", f"单元格位置已保存到 {csv_path}")
+        return True
+    except Exception as e:
+        report("log", f"创建单元格位置文件时出错: {e}")
+        return False
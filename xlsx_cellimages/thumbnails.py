@@ -0,0 +1,157 @@
+"""
+图像规格化（缩略图）阶段
+
+手机拍摄的原图嵌入收集表后，邮件合并生成的文档会非常大。这里在图像提取
+之后，把最长边超过上限的图像按比例缩小并重新编码为指定格式，写入
+thumbnails 目录；已在上限以内且格式相同的图像不重新编码，派生路径即原图路径。
+解码和缩放是CPU密集操作，在进程池中并行执行。
+
+依赖Pillow（可选）：pip install pillow
+"""
+import os
+
+from .engine import _noop
+
+THUMBNAIL_DIR = 'thumbnails'
+THUMBNAIL_FORMATS = ('jpeg', 'png', 'webp')
+THUMBNAIL_DEFAULT_SIZE = 1600
+THUMBNAIL_QUALITY = 85
+
+_EXTENSIONS = {'jpeg': '.jpg', 'png': '.png', 'webp': '.webp'}
+# Pillow对带MP扩展的手机JPEG照片报告为MPO，按JPEG处理
+_FORMAT_ALIASES = {'mpo': 'jpeg'}
+
+
+def pillow_available():
+    """Pillow是否已安装"""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def thumbnail_name(image, fmt=None):
+    """派生文件名：指定格式时替换扩展名，否则保持原名"""
+    if fmt is None:
+        return image
+    return os.path.splitext(image)[0] + _EXTENSIONS[fmt]
+
+
+def normalize_image(source_path, target_path, max_size, fmt=None, quality=THUMBNAIL_QUALITY):
+    """
+    把一个图像缩小到最长边不超过 max_size 并按 fmt 重新编码，返回派生文件路径
+
+    图像已在上限以内且无需转换格式时不写新文件，返回 source_path。派生文件的
+    扩展名按实际编码格式确定（媒体文件名的扩展名不一定与内容相符）。派生文件
+    已存在、不早于原图且尺寸与本次的上限相符时直接复用（增量提取时避免重复编码）。
+    在进程池中执行，Pillow在这里导入。
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as img:
+        # Image.open只读取文件头，尺寸判断不需要解码整个图像
+        source_fmt = (img.format or '').lower()
+        source_fmt = _FORMAT_ALIASES.get(source_fmt, source_fmt)
+        if max(img.size) <= max_size and (fmt is None or fmt == source_fmt):
+            return source_path
+        save_fmt = fmt or source_fmt
+        if save_fmt not in THUMBNAIL_FORMATS:
+            # 其他格式（如GIF、BMP）统一编码为PNG
+            save_fmt = 'png'
+        target_path = os.path.splitext(target_path)[0] + _EXTENSIONS[save_fmt]
+        if _reusable(target_path, source_path, min(max(img.size), max_size)):
+            return target_path
+        # JPEG可在解码时直接按2的幂缩小，之后再精确缩放
+        img.draft('RGB', (max_size, max_size))
+        # 手机照片通常依靠EXIF方向标记旋转，缩放前先应用
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_size, max_size), Image.LANCZOS)
+        if save_fmt == 'jpeg' and img.mode not in ('RGB', 'L'):
+            # JPEG不支持透明通道，透明部分填充白色
+            background = Image.new('RGB', img.size, 'white')
+            rgba = img.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            img = background
+
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        tmp_path = target_path + '.tmp'
+        options = {'optimize': True}
+        if save_fmt in ('jpeg', 'webp'):
+            options['quality'] = quality
+        img.save(tmp_path, format=save_fmt.upper(), **options)
+    os.replace(tmp_path, target_path)
+    return target_path
+
+
+def _reusable(target_path, source_path, longest):
+    """已有的派生文件是否可以复用：不早于原图，且最长边与本次的结果相同"""
+    from PIL import Image
+
+    try:
+        if os.path.getmtime(target_path) < os.path.getmtime(source_path):
+            return False
+        with Image.open(target_path) as existing:
+            return max(existing.size) == longest
+    except (OSError, ValueError):
+        return False
+
+
+def _normalize_one(args):
+    image, source_path, target_path, max_size, fmt = args
+    try:
+        return image, normalize_image(source_path, target_path, max_size, fmt), None
+    except Exception as e:
+        return image, None, f"{type(e).__name__}: {e}"
+
+
+def make_thumbnails(sources, dest_dir, max_size=THUMBNAIL_DEFAULT_SIZE, fmt=None, workers=None, report=None):
+    """
+    为一组已提取的图像生成规格化后的文件
+
+    Parameters:
+        sources   – {图像文件名: 原图路径}
+        dest_dir  – 派生文件目录
+        max_size  – 最长边的像素上限
+        fmt       – "jpeg"、"png"、"webp"，None 表示保持原格式
+        workers   – 进程数；1 表示在当前进程执行，None 或 0 表示使用全部CPU
+
+    返回 {图像文件名: 派生文件路径}（未缩小的图像为原图路径）；无法处理的图像
+    （如EMF等Pillow不支持的格式）记录日志后不出现在结果中。Pillow未安装时
+    返回None。
+    """
+    report = report or _noop
+    if not pillow_available():
+        report("log", "警告: Pillow库未安装，无法生成缩略图")
+        report("log", "请使用以下命令安装: pip install pillow")
+        return None
+
+    jobs = [(image, path, os.path.join(dest_dir, thumbnail_name(image, fmt)), max_size, fmt)
+            for image, path in sources.items()]
+    derived = {}
+    resized = 0
+
+    def collect(results):
+        nonlocal resized
+        for count, (image, path, error) in enumerate(results, 1):
+            if error is not None:
+                report("log", f"无法生成缩略图 {image}: {error}")
+            else:
+                derived[image] = path
+                if path != sources[image]:
+                    resized += 1
+            report("progress", 90 + count / len(jobs) * 10)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) < 2:
+        collect(map(_normalize_one, jobs))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            # 图像较小时每个任务只处理一张开销偏大，分块提交
+            chunksize = max(1, min(64, len(jobs) // (workers * 4)))
+            collect(pool.map(_normalize_one, jobs, chunksize=chunksize))
+    report("log", f"缩略图: {resized} 个图像已缩小或转换格式（最长边上限 {max_size} 像素），"
+                  f"{len(derived) - resized} 个无需处理")
+    return derived
@@ -0,0 +1,490 @@
+"""
+监视目录模式: python -m xlsx_cellimages.watch 投放目录 -o 输出根目录 [选项]
+
+定期扫描投放目录中的 .xlsx 文件（os.scandir，只读取目录项和文件状态），
+文件大小和修改时间在 --settle 秒内保持不变时视为写入完成，加入持久化的
+任务队列；进程池中的工作进程使用与批处理相同的提取逻辑，每个工作簿写入
+输出根目录/<文件名>/。文件之后再次变化时作为新任务重新提取。
+
+任务队列保存在SQLite数据库中（默认 输出根目录/.watch_jobs.sqlite3），记录每个
+任务的状态（queued、running、done、failed、superseded）、发现/开始/完成时间、
+耗时、图像数和分阶段指标；--status 输出任务列表后退出。
+
+同一文件的同一版本（路径、大小、修改时间）只处理一次，服务重启后不会重复
+提取已完成的任务。崩溃时处于 running 状态的任务在下次启动时重新排队，
+提取始终为增量模式，上次完成时写出的未变化图像不再重复解压；中断次数
+达到 --max-attempts 的任务记为失败，避免反复崩溃。
+"""
+import argparse
+import json
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+from .batch import _extract_one
+from .cli import EXIT_OK, EXIT_USAGE, format_stats
+from .dedup import DEDUP_MODES
+from .engine import _noop
+
+JOBS_DB_NAME = '.watch_jobs.sqlite3'
+DEFAULT_INTERVAL = 1.0
+DEFAULT_SETTLE = 2.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    output_dir TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    detected_at REAL,
+    queued_at REAL,
+    started_at REAL,
+    finished_at REAL,
+    seconds REAL,
+    images INTEGER,
+    error TEXT,
+    metrics TEXT,
+    UNIQUE (path, size, mtime_ns)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+"""
+
+
+@dataclass
+class Job:
+    """任务队列中的一个工作簿版本"""
+    id: int
+    path: str
+    size: int
+    mtime_ns: int
+    output_dir: str
+    status: str
+    attempts: int = 0
+    detected_at: float | None = None
+    queued_at: float | None = None
+    started_at: float | None = None
+    finished_at: float | None = None
+    seconds: float | None = None
+    images: int | None = None
+    error: str | None = None
+    metrics: str | None = None
+
+    @property
+    def latency(self):
+        """从文件最后修改到提取完成的秒数"""
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.mtime_ns / 1e9
+
+
+class JobQueue:
+    """
+    SQLite中的持久化任务队列
+
+    只在创建它的线程中使用。每次状态变化都立即提交，进程崩溃后队列保持
+    最后一次提交时的状态。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        # WAL模式下 --status 可以在服务运行时读取
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def _job(self, row):
+        return Job(**dict(row)) if row is not None else None
+
+    def recover(self, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """把上次运行中断时处于 running 状态的任务重新排队（见 release），返回这些任务"""
+        rows = self._db.execute("SELECT id FROM jobs WHERE status = 'running' ORDER BY id").fetchall()
+        return [self.release(row['id'], max_attempts) for row in rows]
+
+    def release(self, job_id, max_attempts=DEFAULT_MAX_ATTEMPTS, reason="处理中断"):
+        """
+        未完成的任务重新排队；已中断 max_attempts 次时记为失败，避免一个会导致
+        进程崩溃的文件被反复处理
+        """
+        job = self.get(job_id)
+        with self._db:
+            if job.attempts >= max_attempts:
+                self._db.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                                 (f"{reason} {job.attempts} 次", time.time(), job_id))
+            else:
+                self._db.execute("UPDATE jobs SET status = 'queued' WHERE id = ?", (job_id,))
+        return self.get(job_id)
+
+    def enqueue(self, path, size, mtime_ns, output_dir, detected_at=None):
+        """
+        加入一个工作簿版本，返回新任务；该版本已在队列中（无论状态）时返回None
+
+        同一路径尚未开始的旧版本任务标记为 superseded。
+        """
+        now = time.time()
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO jobs (path, size, mtime_ns, output_dir, detected_at, queued_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, output_dir, detected_at or now, now))
+            if not cursor.rowcount:
+                return None
+            self._db.execute("UPDATE jobs SET status = 'superseded' WHERE path = ? AND status = 'queued' AND id < ?",
+                             (path, cursor.lastrowid))
+        return self.get(cursor.lastrowid)
+
+    def get(self, job_id):
+        return self._job(self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def claim(self):
+        """
+        取出最早排队的任务并标记为 running，没有可运行的任务时返回None
+
+        同一输出目录（同一文件）已有任务在运行时，其后的任务等待它完成，避免两个
+        工作进程同时写入同一个输出目录。
+        """
+        with self._db:
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' "
+                "AND output_dir NOT IN (SELECT output_dir FROM jobs WHERE status = 'running') "
+                "ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, "
+                             "finished_at = NULL, error = NULL WHERE id = ?", (time.time(), row['id']))
+        return self.get(row['id'])
+
+    def finish(self, job_id, item):
+        """记录任务结果，item 为 BatchItem"""
+        now = time.time()
+        result = item.result
+        error = item.error
+        if error is None and not item.ok:
+            error = "生成报告时出错"
+        with self._db:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, seconds = ? - started_at, images = ?, error = ?, "
+                "metrics = ? WHERE id = ?",
+                ('failed' if error is not None else 'done', now, now,
+                 len(result.images) if result is not None else None, error,
+                 json.dumps(result.metrics) if result is not None and result.metrics else None, job_id))
+        return self.get(job_id)
+
+    def jobs(self, status=None):
+        """按发现顺序返回任务，status 为None时返回全部"""
+        if status is None:
+            rows = self._db.execute("SELECT * FROM jobs ORDER BY id")
+        else:
+            rows = self._db.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id", (status,))
+        return [self._job(row) for row in rows]
+
+    def pending(self):
+        """排队中的任务数"""
+        return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+
+def _is_candidate(name):
+    # 跳过Office/WPS的锁文件（~$开头）和隐藏文件
+    return name.lower().endswith('.xlsx') and not name.startswith(('~$', '.'))
+
+
+class FolderWatcher:
+    """
+    轮询一个目录，返回写入完成的 .xlsx 文件
+
+    文件大小和修改时间连续 settle 秒不变时视为写入完成。复制工具可能保留
+    源文件的修改时间，因此不以修改时间的早晚判断，而是观察一段时间内是否变化。
+    """
+
+    def __init__(self, folder, settle=DEFAULT_SETTLE):
+        self.folder = folder
+        self.settle = settle
+        # {路径: [(大小, 修改时间), 首次观察到该状态的时间, 是否已返回, 首次发现的时刻]}
+        self._seen = {}
+
+    def settling(self):
+        """是否还有文件在等待写入完成"""
+        return any(not state[2] for state in self._seen.values())
+
+    def poll(self, now=None):
+        """扫描一次目录，返回本次新变为稳定的 [(路径, 大小, 修改时间ns, 首次发现时间), ...]"""
+        now = time.monotonic() if now is None else now
+        wall = time.time()
+        current = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if not _is_candidate(entry.name):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                current[os.path.abspath(entry.path)] = (st.st_size, st.st_mtime_ns)
+
+        stable = []
+        for path, signature in current.items():
+            state = self._seen.get(path)
+            if state is None or state[0] != signature:
+                self._seen[path] = [signature, now, False, wall]
+            elif not state[2] and now - state[1] >= self.settle:
+                state[2] = True
+                stable.append((path, signature[0], signature[1], state[3]))
+        for path in self._seen.keys() - current.keys():
+            del self._seen[path]
+        return stable
+
+
+def _ignore_sigint():
+    # 工作进程忽略Ctrl+C，由主进程等待正在运行的任务完成后退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def run_watch(folder, output_root, workers=1, interval=DEFAULT_INTERVAL, settle=DEFAULT_SETTLE,
+              db_path=None, max_attempts=DEFAULT_MAX_ATTEMPTS, once=False, stop=None, report=None, **options):
+    """
+    监视 folder，把写入完成的工作簿提取到 output_root 下
+
+    Parameters:
+        workers       – 同时处理的工作簿数（工作进程数）
+        interval      – 扫描目录的间隔秒数
+        settle        – 文件大小和修改时间保持不变多少秒后开始处理
+        db_path       – 任务队列数据库，默认 output_root/.watch_jobs.sqlite3
+        max_attempts  – 任务被中断的次数上限
+        once          – 为True时处理完当前已有的文件后返回
+        stop          – 可选 threading.Event，设置后等待正在运行的任务完成并返回
+        report        – 可选回调，接收 ("log", 文本)、("queued", Job) 和 ("done", Job, BatchItem) 消息
+        options       – 传给 run_extraction 的选项；始终启用增量提取
+
+    返回本次运行中完成的任务列表。
+    """
+    report = report or _noop
+    stop = stop or threading.Event()
+    os.makedirs(output_root, exist_ok=True)
+    if options.get('dedup') and not options.get('dedup_dir'):
+        options['dedup_dir'] = os.path.join(output_root, 'blobs')
+    options['incremental'] = True
+    queue = JobQueue(db_path or os.path.join(output_root, JOBS_DB_NAME))
+    watcher = FolderWatcher(folder, settle)
+    workers = max(1, workers or os.cpu_count() or 1)
+    finished = []
+
+    try:
+        for job in queue.recover(max_attempts):
+            if job.status == 'queued':
+                report("log", f"重新排队上次中断的任务: {job.path}")
+            else:
+                report("log", f"放弃任务: {job.path}: {job.error}")
+                finished.append(job)
+        if queue.pending():
+            report("log", f"队列中有 {queue.pending()} 个待处理任务")
+
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_ignore_sigint)
+        running = {}
+        next_poll = 0.0
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= next_poll and not stop.is_set():
+                    for path, size, mtime_ns, detected_at in watcher.poll(now):
+                        output_dir = os.path.join(output_root, os.path.splitext(os.path.basename(path))[0])
+                        job = queue.enqueue(path, size, mtime_ns, output_dir, detected_at)
+                        if job is not None:
+                            report("queued", job)
+                    next_poll = now + interval
+
+                while not stop.is_set() and len(running) < workers:
+                    job = queue.claim()
+                    if job is None:
+                        break
+                    future = pool.submit(_extract_one, job.path, job.output_dir, options)
+                    running[future] = job
+
+                if not running:
+                    if stop.is_set() or (once and not queue.pending() and not watcher.settling()):
+                        break
+                    stop.wait(max(0.0, next_poll - time.monotonic()))
+                    continue
+
+                # 停止后不再扫描目录，只等待运行中的任务完成
+                timeout = None if stop.is_set() else max(0.0, next_poll - time.monotonic())
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        item = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        running[future] = job
+                        continue
+                    job = queue.finish(job.id, item)
+                    finished.append(job)
+                    report("done", job, item)
+                if broken:
+                    # 工作进程异常退出（如内存不足被终止）时进程池中的全部任务都会失败，
+                    # 无法区分是哪个文件导致的，按中断处理后重建进程池
+                    for job in running.values():
+                        job = queue.release(job.id, max_attempts, "工作进程异常退出")
+                        if job.status == 'failed':
+                            finished.append(job)
+                            report("done", job, None)
+                        else:
+                            report("log", f"工作进程异常退出，重新排队: {job.path}")
+                    running.clear()
+                    pool.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(max_workers=workers, initializer=_ignore_sigint)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+    finally:
+        queue.close()
+    return finished
+
+
+def format_job(job):
+    """单行任务摘要"""
+    parts = [f"#{job.id}", job.status, job.path]
+    if job.images is not None:
+        parts.append(f"{job.images} 个图像")
+    if job.seconds is not None:
+        parts.append(f"耗时 {job.seconds:.2f} 秒")
+    if job.started_at is not None and job.queued_at is not None:
+        parts.append(f"排队 {max(0.0, job.started_at - job.queued_at):.2f} 秒")
+    if job.latency is not None:
+        parts.append(f"修改后 {job.latency:.2f} 秒完成")
+    if job.attempts > 1:
+        parts.append(f"第 {job.attempts} 次")
+    if job.error:
+        parts.append(job.error)
+    return " | ".join(parts)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m xlsx_cellimages.watch",
+        description="监视投放目录，自动提取新增或变化的XLSX文件中的单元格图像",
+    )
+    parser.add_argument("folder", help="投放目录")
+    parser.add_argument("-o", "--output", required=True, help="输出根目录")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="同时处理的工作簿数，0 表示使用全部CPU（默认: 1）")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                        help=f"扫描目录的间隔秒数（默认: {DEFAULT_INTERVAL:g}）")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE,
+                        help=f"文件保持不变多少秒后开始处理（默认: {DEFAULT_SETTLE:g}）")
+    parser.add_argument("--db", help=f"任务队列数据库（默认: 输出根目录/{JOBS_DB_NAME}）")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help=f"任务被中断的次数上限，超过后记为失败（默认: {DEFAULT_MAX_ATTEMPTS}）")
+    parser.add_argument("--once", action="store_true", help="处理完目录中已有的文件后退出")
+    parser.add_argument("--status", action="store_true", help="输出任务队列中的任务后退出")
+    parser.add_argument("--csv", action="store_true", help="输出 extracted_images.csv")
+    parser.add_argument("--no-excel", action="store_true", help="不输出 extracted_images.xlsx")
+    parser.add_argument("--inflate-workers", type=int, default=1,
+                        help="每个工作簿提取图像文件时的解压线程数（默认: 1）")
+    parser.add_argument("--referenced-only", action="store_true",
+                        help="只提取cellimages.xml中被单元格引用的图像文件")
+    parser.add_argument("--dedup", choices=DEDUP_MODES,
+                        help="按内容去重：cas 报告直接指向去重存储中的文件；hardlink media目录中为硬链接")
+    parser.add_argument("--cells", action="store_true",
+                        help="扫描工作表中的DISPIMG公式，输出图像所在单元格 extracted_cells.csv")
+    parser.add_argument("--key-column", default="A", metavar="COL",
+                        help="extracted_cells.csv 中行键取自的列（默认: A）")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", action="store_true", help="输出详细日志")
+    verbosity.add_argument("-q", "--quiet", action="store_true", help="仅输出错误")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    db_path = args.db or os.path.join(args.output, JOBS_DB_NAME)
+
+    if args.status:
+        if not os.path.exists(db_path):
+            print(f"错误: 任务队列不存在: {db_path}", file=sys.stderr)
+            return EXIT_USAGE
+        queue = JobQueue(db_path)
+        try:
+            for job in queue.jobs():
+                print(format_job(job))
+        finally:
+            queue.close()
+        return EXIT_OK
+
+    if not os.path.isdir(args.folder):
+        print(f"错误: 投放目录不存在: {args.folder}", file=sys.stderr)
+        return EXIT_USAGE
+    if args.workers < 0 or args.inflate_workers < 1 or args.max_attempts < 1:
+        print("错误: --workers 不能为负数，--inflate-workers 和 --max-attempts 至少为1", file=sys.stderr)
+        return EXIT_USAGE
+    if args.interval <= 0 or args.settle < 0:
+        print("错误: --interval 应大于0，--settle 不能为负数", file=sys.stderr)
+        return EXIT_USAGE
+    if not args.key_column.isalpha():
+        print("错误: --key-column 应为列字母，如 A", file=sys.stderr)
+        return EXIT_USAGE
+
+    def report(msg_type, *msg_args):
+        if msg_type == "log" and not args.quiet:
+            print(*msg_args, file=sys.stderr)
+        elif msg_type == "queued" and args.verbose:
+            print(f"发现: {msg_args[0].path}", file=sys.stderr)
+        elif msg_type == "done":
+            job, item = msg_args
+            if job.status != 'done':
+                print(f"失败: {format_job(job)}", file=sys.stderr)
+            elif not args.quiet:
+                stats = format_stats(item.result) if item is not None and item.result is not None else ""
+                print(f"{format_job(job)} -> {job.output_dir}{stats}")
+            sys.stdout.flush()
+
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        if not stop.is_set():
+            print("正在等待进行中的任务完成...", file=sys.stderr)
+        stop.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, request_stop)
+
+    if not args.quiet:
+        print(f"正在监视 {os.path.abspath(args.folder)}（任务队列: {db_path}），按Ctrl+C停止", file=sys.stderr)
+    run_watch(
+        args.folder, args.output,
+        workers=args.workers,
+        interval=args.interval,
+        settle=args.settle,
+        db_path=db_path,
+        max_attempts=args.max_attempts,
+        once=args.once,
+        stop=stop,
+        report=report,
+        create_csv_file=args.csv,
+        create_excel=not args.no_excel,
+        inflate_workers=args.inflate_workers,
+        referenced_only=args.referenced_only,
+        dedup=args.dedup,
+        locate_cells=args.cells,
+        key_column=args.key_column.upper(),
+    )
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())